@@ -0,0 +1,7 @@
+# Benchmarks of the CycleGAN hot paths
+'''
+Every benchmark runs on the CPU with synthetic data and is started from the root of the repository:
+	python -m benchmarks.suite         the hot paths of data preparation, sampling, the models and training, as JSON
+	python -m benchmarks.precision     float32 against mixed precision training steps
+	python -m benchmarks.instancenorm  the instance normalization layer against keras-contrib
+'''
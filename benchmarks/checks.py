@@ -0,0 +1,176 @@
+# Checking that saved state is restored exactly
+'''
+This script runs short end-to-end checks of the code paths that only matter when something goes wrong, and exits with
+status 1 if any of them fails.
+
+	python -m benchmarks.checks checkpoint dataset
+
+The checks:
+	checkpoint  trains the debug models on random images for one epoch with the compiled models and with the fused
+	            training step, restores the checkpoint it wrote into freshly built models and compares every array of
+	            the restored state with the saved one, then resumes training from it for another epoch
+	dataset     updates a prepared dataset incrementally after adding, changing and removing images, among them
+	            exact, near and train/test duplicates, and compares it with a dataset built from scratch every time
+
+Everything is written to a temporary directory, which is removed afterwards. TensorFlow is hidden from any GPU.
+'''
+import os
+import sys
+import argparse
+import tempfile
+from os.path import join
+from numpy import array_equal
+from numpy import asarray
+from numpy import clip
+from numpy import load
+from numpy.random import randint
+from numpy.random import seed
+from PIL import Image
+
+# train, restore and resume with the compiled models and with the fused step, returns a list of failures
+def check_checkpoint(args):
+	from cyclegan.config import get_config
+	from cyclegan.data import ImagePool
+	from cyclegan.models import define_models
+	from cyclegan.training import compiled_optimizers
+	from cyclegan.training import define_train_step
+	from cyclegan.training import latest_checkpoint
+	from cyclegan.training import restore_checkpoint
+	from cyclegan.training import snapshot_checkpoint
+	from cyclegan.training import train
+	failures = list()
+	config = get_config('debug', image_size=args.size, n_epochs=1, save_every=1, pool_size=2)
+	image_shape = (args.size, args.size, 3)
+	seed(1)
+	dataset = [randint(0, 256, (args.images,) + image_shape).astype('uint8') for _ in range(2)]
+	for fused in (False, True):
+		name = 'fused' if fused else 'compiled'
+		directory = join(os.getcwd(), name)
+		# one epoch from scratch, which ends with a checkpoint
+		train(*define_models(image_shape, config=config), dataset, n_prefetch=0, fused=fused, config=config,
+			checkpoint_dir=directory, log_dir=join(directory, 'logs'), seed=1)
+		filename = latest_checkpoint(directory)
+		if filename is None:
+			failures.append('%s: no checkpoint written' % name)
+			continue
+		# restore it into new models and optimizers, a snapshot of them has to hold the same arrays
+		d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB, c_model_BtoA = define_models(image_shape,
+			config=config)
+		if fused:
+			optimizers = define_train_step(g_model_AtoB, g_model_BtoA, d_model_A, d_model_B, config['lr'],
+				beta_1=config['beta_1']).optimizers
+		else:
+			optimizers = compiled_optimizers(d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB,
+				c_model_BtoA)
+		models = {'g_model_AtoB': g_model_AtoB, 'g_model_BtoA': g_model_BtoA, 'd_model_A': d_model_A,
+			'd_model_B': d_model_B}
+		pools = {'poolA': ImagePool(config['pool_size']), 'poolB': ImagePool(config['pool_size'])}
+		step = restore_checkpoint(filename, models, optimizers, pools)
+		saved = dict(load(filename))
+		restored = snapshot_checkpoint(step, models, optimizers, pools)
+		if sorted(saved) != sorted(restored):
+			failures.append('%s: the restored state holds %s, the checkpoint %s' % (name,
+				sorted(set(restored) ^ set(saved)), filename))
+		for key in sorted(set(saved) & set(restored)):
+			if not array_equal(saved[key], restored[key]):
+				failures.append('%s: %s differs after restoring' % (name, key))
+		# resume for another epoch from the checkpoint
+		config_resume = dict(config, n_epochs=2)
+		train(*define_models(image_shape, config=config_resume), dataset, n_prefetch=0, fused=fused,
+			config=config_resume, checkpoint_dir=directory, log_dir=join(directory, 'logs'), seed=1)
+		if latest_checkpoint(directory) == filename:
+			failures.append('%s: no checkpoint written after resuming' % name)
+	return failures
+
+# a random smooth image, so that a slightly changed copy is a near duplicate of it
+def smooth_image(size):
+	pixels = randint(0, 256, (8, 8, 3)).astype('uint8')
+	return Image.fromarray(pixels).resize((size, size), Image.BILINEAR)
+
+# the kept rows and pixels of every array and the dropped duplicates of a dataset, in file order
+def dataset_contents(filename):
+	import json
+	from cyclegan.data import ARRAYS
+	from cyclegan.data import manifest_filename
+	with open(manifest_filename(filename)) as f:
+		manifest = json.load(f)
+	contents = dict()
+	for name in ARRAYS:
+		entry = manifest['arrays'][name]
+		data = load(join(filename, name + '.npy'))
+		rows = sorted((row['file'], row['sha256'], data[i].tobytes()) for i, row in enumerate(entry['rows']))
+		contents[name] = (rows, sorted((row['file'], row['sha256'], row['of'], row['of_sha256']) for row in entry['dropped']))
+	return contents
+
+# update a dataset after each change of its images and compare it with a rebuild, returns a list of failures
+def check_dataset(args):
+	from cyclegan.data import build_dataset
+	failures = list()
+	path = join(os.getcwd(), 'images') + '/'
+	for folder in ('trainA', 'trainB', 'testA', 'testB'):
+		os.makedirs(path + folder)
+	seed(1)
+	# write an image, with a new modification time so that a changed file is hashed again
+	def write(file, image):
+		image.save(path + file)
+		status = os.stat(path + file)
+		os.utime(path + file, ns=(status.st_atime_ns, status.st_mtime_ns + 10**9))
+	# a slightly changed copy of an image
+	def near_copy(file):
+		pixels = asarray(Image.open(path + file)).astype('int16') + randint(-2, 3, (args.size, args.size, 3))
+		return Image.fromarray(clip(pixels, 0, 255).astype('uint8'))
+	# the changes made to the images, each one followed by an update
+	def initial():
+		for folder, n_images in (('trainA', 4), ('trainB', 3), ('testA', 2), ('testB', 2)):
+			for i in range(n_images):
+				write('%s/%04d.png' % (folder, i), smooth_image(args.size))
+		write('trainA/dup.png', Image.open(path + 'trainA/0000.png'))
+		write('testA/leak.png', Image.open(path + 'trainA/0001.png'))
+	def add_images():
+		write('trainA/0004.png', smooth_image(args.size))
+		write('trainA/near.png', near_copy('trainA/0002.png'))
+		write('testB/leak.png', near_copy('trainB/0001.png'))
+	def change_original():
+		write('trainA/0001.png', smooth_image(args.size))
+	def remove_original():
+		os.remove(path + 'trainA/0000.png')
+		os.remove(path + 'trainB/0001.png')
+	for change in (initial, add_images, change_original, remove_original):
+		change()
+		build_dataset(path, join(os.getcwd(), 'incremental'), (args.size, args.size), 1)
+		build_dataset(path, join(os.getcwd(), 'forced'), (args.size, args.size), 1, force=True)
+		incremental, forced = dataset_contents('incremental'), dataset_contents('forced')
+		for name in sorted(forced):
+			if incremental[name][0] != forced[name][0]:
+				failures.append('%s: the incremental %s rows differ from a rebuild' % (change.__name__, name))
+			if incremental[name][1] != forced[name][1]:
+				failures.append('%s: the incremental %s duplicates %s differ from a rebuild %s' % (change.__name__,
+					name, [row[:3] for row in incremental[name][1]], [row[:3] for row in forced[name][1]]))
+	return failures
+
+# the available checks
+CHECKS = {'checkpoint': check_checkpoint, 'dataset': check_dataset}
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Check that saved state is restored exactly')
+	parser.add_argument('checks', nargs='*', help='the checks to run, all by default: %s' % ' '.join(sorted(CHECKS)))
+	parser.add_argument('--size', type=int, default=32, help='image height and width')
+	parser.add_argument('--images', type=int, default=2, help='images per domain')
+	args = parser.parse_args()
+	for check in args.checks:
+		if check not in CHECKS:
+			parser.error('Unknown check: %s' % check)
+	os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+	failures = list()
+	# run in a temporary directory, as train() saves the generators and plots to the working directory
+	cwd = os.getcwd()
+	with tempfile.TemporaryDirectory() as directory:
+		os.chdir(directory)
+		for check in args.checks or sorted(CHECKS):
+			print('>Checking %s' % check)
+			failures += ['%s: %s' % (check, failure) for failure in CHECKS[check](args)]
+		os.chdir(cwd)
+	for failure in failures:
+		print('>FAILED %s' % failure)
+	print('>%d failures' % len(failures))
+	sys.exit(1 if failures else 0)
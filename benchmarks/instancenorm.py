@@ -0,0 +1,102 @@
+# Timing the instance normalization layer on the CPU
+'''
+This script times the InstanceNormalization layer of cyclegan/models.py against the keras-contrib layer it replaces, at
+the shapes of the activations it normalizes in the generator for 256x256 images:
+	256x256x64   after c7s1-64 and u64
+	128x128x128  after d128 and u128
+	64x64x256    after d256 and in each of the nine resnet blocks
+
+	python -m benchmarks.instancenorm --batch 1 --repeats 50
+
+Each variant is timed for a forward pass and for a forward and backward pass, in a tf.function, as the median over
+--repeats calls after a few warmup calls:
+	contrib  keras-contrib InstanceNormalization followed by a ReLU layer, when keras-contrib is installed
+	native   the layer of cyclegan/models.py followed by a ReLU layer
+	fused    the layer of cyclegan/models.py with activation='relu'
+
+The contrib weights are copied into the native layers, and the largest difference of their outputs is reported as well,
+so the benchmark doubles as a check that the two layers are interchangeable.
+'''
+import time
+import argparse
+from numpy import median
+from numpy.random import rand
+from numpy.random import randn
+import tensorflow as tf
+from keras.layers import Activation
+from cyclegan.models import InstanceNormalization
+
+# the activations normalized in the generator, as (height, width, channels)
+GENERATOR_SHAPES = [(256, 256, 64), (128, 128, 128), (64, 64, 256)]
+
+# import the keras-contrib layer when it is installed
+def contrib_layer():
+	try:
+		from keras_contrib.layers.normalization.instancenormalization import InstanceNormalization as ContribNormalization
+	except ImportError:
+		return None
+	return ContribNormalization
+
+# build the layers of each variant for one shape, all with the same random gamma and beta
+def build_variants(shape):
+	gamma = 1 + 0.1 * randn(shape[-1]).astype('float32')
+	beta = 0.1 * randn(shape[-1]).astype('float32')
+	variants = dict()
+	ContribNormalization = contrib_layer()
+	if ContribNormalization is not None:
+		variants['contrib'] = [ContribNormalization(axis=-1), Activation('relu')]
+	variants['native'] = [InstanceNormalization(axis=-1), Activation('relu')]
+	variants['fused'] = [InstanceNormalization(axis=-1, activation='relu')]
+	for layers in variants.values():
+		layers[0].build((None,) + shape)
+		layers[0].set_weights([gamma, beta])
+	return variants
+
+# compile the forward pass, and the forward and backward pass, of a stack of layers
+def compile_variant(layers):
+	@tf.function
+	def forward(X):
+		for layer in layers:
+			X = layer(X)
+		return X
+	@tf.function
+	def backward(X):
+		with tf.GradientTape() as tape:
+			tape.watch(X)
+			loss = tf.reduce_sum(forward(X))
+		return tape.gradient(loss, [X] + layers[0].trainable_weights)
+	return forward, backward
+
+# median time of a function in milliseconds
+def time_function(fn, X, n_repeats, n_warmup=3):
+	for _ in range(n_warmup):
+		fn(X)
+	times = list()
+	for _ in range(n_repeats):
+		start = time.perf_counter()
+		result = fn(X)
+		# wait for the result, the first tensor is enough as all are computed by the same call
+		(result[0] if isinstance(result, list) else result).numpy()
+		times.append(time.perf_counter() - start)
+	return 1000.0 * median(times)
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Time the native instance normalization against keras-contrib')
+	parser.add_argument('--batch', type=int, default=1, help='images per call')
+	parser.add_argument('--repeats', type=int, default=50, help='number of timed calls per variant')
+	args = parser.parse_args()
+	if contrib_layer() is None:
+		print('>keras-contrib is not installed, timing the native layers only')
+	print('%-16s %-8s %12s %12s %10s' % ('shape', 'variant', 'forward ms', 'backward ms', 'max diff'))
+	for shape in GENERATOR_SHAPES:
+		X = tf.constant(rand(args.batch, *shape).astype('float32') * 4 - 2)
+		variants = build_variants(shape)
+		outputs = dict()
+		for name, layers in variants.items():
+			forward, backward = compile_variant(layers)
+			outputs[name] = forward(X).numpy()
+			forward_ms = time_function(forward, X, args.repeats)
+			backward_ms = time_function(backward, X, args.repeats)
+			reference = outputs.get('contrib', outputs['native'])
+			diff = abs(outputs[name] - reference).max()
+			print('%-16s %-8s %12.2f %12.2f %10.2e' % ('x'.join(map(str, shape)), name, forward_ms, backward_ms, diff))
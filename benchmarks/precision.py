@@ -0,0 +1,95 @@
+# Comparing float32 and mixed precision training on the CPU
+'''
+This script trains the CycleGAN for a few fused steps on synthetic images once per precision and compares the time per
+step, the peak memory and the loss curves of each mixed precision mode against the float32 baseline.
+
+	python -m benchmarks.precision --size 128 --steps 20 --precisions float32 mixed_bfloat16
+
+Each precision runs in its own process, since the Keras dtype policy is global and the peak resident set size can only
+be measured per process. Every run uses the same seeds, so the models start from the same weights and see the same
+images, and the difference of the losses from the float32 run shows how much the reduced precision changes training.
+The first steps are not timed because they trace and compile the training step.
+'''
+import sys
+import json
+import time
+import argparse
+import subprocess
+from os.path import abspath
+from os.path import dirname
+from numpy import abs as np_abs
+from numpy import asarray
+from numpy import median
+
+# the repository, where the child processes are started so that they find the packages
+ROOT = dirname(dirname(abspath(__file__)))
+
+# train for a few steps in the given precision, returns the timings, memory and losses of the run
+def run_precision(precision, size, n_steps, n_batch, n_warmup):
+	from numpy.random import seed
+	from numpy.random import randint
+	import tensorflow as tf
+	from cyclegan.data import scale_images, ImagePool, peak_rss
+	from cyclegan.models import set_precision, define_models
+	from cyclegan.training import define_train_step
+	set_precision(precision)
+	seed(1)
+	tf.random.set_seed(1)
+	image_shape = (size, size, 3)
+	d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, _, _ = define_models(image_shape)
+	train_step = define_train_step(g_model_AtoB, g_model_BtoA, d_model_A, d_model_B)
+	# synthetic uint8 images, like a memory-mapped dataset
+	trainA = randint(0, 256, (4 * n_batch,) + image_shape).astype('uint8')
+	trainB = randint(0, 256, (4 * n_batch,) + image_shape).astype('uint8')
+	poolA, poolB = ImagePool(), ImagePool()
+	step_times, losses = list(), list()
+	for i in range(n_warmup + n_steps):
+		X_realA = scale_images(trainA[randint(0, len(trainA), n_batch)])
+		X_realB = scale_images(trainB[randint(0, len(trainB), n_batch)])
+		start = time.perf_counter()
+		sourceA, historyA = poolA.select(n_batch, image_shape)
+		sourceB, historyB = poolB.select(n_batch, image_shape)
+		results = train_step(X_realA, X_realB, sourceA, historyA, sourceB, historyB)
+		poolA.push(results[6].numpy())
+		poolB.push(results[7].numpy())
+		if i >= n_warmup:
+			step_times.append(time.perf_counter() - start)
+			losses.append([float(loss) for loss in results[:6]])
+	return {'precision': precision, 'step_ms': 1000.0 * median(step_times), 'peak_rss_mb': peak_rss()[0],
+		'losses': losses}
+
+# run one precision in a child process and read its result
+def benchmark(precision, args):
+	command = [sys.executable, '-m', 'benchmarks.precision', '--child', '--precisions', precision,
+		'--size', str(args.size), '--steps', str(args.steps), '--batch', str(args.batch), '--warmup', str(args.warmup)]
+	output = subprocess.run(command, check=True, stdout=subprocess.PIPE, universal_newlines=True, cwd=ROOT).stdout
+	# the result is the last line, anything before it is output of TensorFlow or Keras
+	return json.loads(output.strip().splitlines()[-1])
+
+# print one line per precision, compared with the first one
+def report(results):
+	baseline = results[0]
+	print('%-16s %10s %8s %12s %16s' % ('precision', 'step ms', 'speedup', 'peak RSS MB', 'max loss diff'))
+	for result in results:
+		diff = np_abs(asarray(result['losses']) - asarray(baseline['losses'])).max()
+		print('%-16s %10.1f %7.2fx %12.0f %16.4f' % (result['precision'], result['step_ms'],
+			baseline['step_ms'] / result['step_ms'], result['peak_rss_mb'], diff))
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Compare float32 and mixed precision training steps on the CPU')
+	parser.add_argument('--precisions', nargs='+', default=['float32', 'mixed_bfloat16'])
+	parser.add_argument('--size', type=int, default=128, help='image height and width')
+	parser.add_argument('--steps', type=int, default=20, help='number of timed steps')
+	parser.add_argument('--batch', type=int, default=1, help='images per step')
+	parser.add_argument('--warmup', type=int, default=2, help='number of steps before timing')
+	parser.add_argument('--output', default=None, help='json file for the results, with the loss of every step')
+	parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+	args = parser.parse_args()
+	if args.child:
+		print(json.dumps(run_precision(args.precisions[0], args.size, args.steps, args.batch, args.warmup)))
+	else:
+		results = [benchmark(precision, args) for precision in args.precisions]
+		report(results)
+		if args.output:
+			with open(args.output, 'w') as f:
+				json.dump(results, f, indent=1)
@@ -0,0 +1,326 @@
+# Benchmarking the CycleGAN hot paths on the CPU
+'''
+This script times the hot paths of the project on synthetic images and writes the results to a JSON file, so that runs
+on different commits can be compared.
+
+	python -m benchmarks.suite --size 128 --batch 1 --output results.json
+	python -m benchmarks.suite --size 128 --batch 1 --compare results.json --tolerance 0.2
+
+The benchmarks, each reported as one or more metrics:
+	load_images            decoding and resizing a folder of JPEG images, in images/sec
+	load_real_samples      loading the prepared dataset as memory-mapped .npy files and as a compressed .npz file, in ms
+	                       and in MB of memory added to the process
+	generate_real_samples  gathering and scaling one batch of real images, in ms
+	augment_images         gathering one batch of random crops of (--size * 256 / 286) pixels, half of them flipped,
+	                       in ms, and with color jitter on top
+	update_image_pool      passing one batch of fakes through a full image pool, in ms
+	generator_forward      one generator call on a batch, in ms
+	discriminator_forward  one discriminator call on a batch, in ms
+	train_iteration        one iteration of the train() loop with the compiled models, in ms and in images/sec
+	fused_iteration        one iteration of the train() loop with the fused training step, in ms and in images/sec
+	save_models            saving both generators as .h5 files, in ms
+
+Timings are the median over --repeats runs after a warmup run, which traces and compiles what needs it. The images are
+random, written to a temporary directory at (--size * 286 / 256) pixels so that decoding includes the resize, and the
+prepared arrays hold --images images per domain. The models are those of --preset, see cyclegan/config.py, for images
+of --size. TensorFlow is hidden from any GPU, so the numbers only depend on the CPU.
+
+With --compare the results are checked against an earlier results file instead: every metric that is worse than the
+earlier one by more than --tolerance, as a fraction, and by more than --min-change in its own unit, is reported as a
+regression and the exit status is 1. Only results measured with the same preset, size and batch are comparable, a
+mismatch is reported as an error. The throughput of training against the batch size is measured by running the suite
+once for each --batch.
+'''
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tempfile
+from os import makedirs
+from os.path import abspath
+from os.path import dirname
+from os.path import join
+from numpy import median
+from numpy import savez_compressed
+from numpy.random import randint
+from numpy.random import seed
+from PIL import Image
+from cyclegan.config import PRESETS
+from cyclegan.config import get_config
+
+# the repository, for the commit the results were measured on
+ROOT = dirname(dirname(abspath(__file__)))
+
+# resident set size of this process in MB now, rather than its peak
+def current_rss():
+	try:
+		with open('/proc/self/statm') as f:
+			return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024.0 * 1024.0)
+	except (OSError, ValueError):
+		from cyclegan.data import peak_rss
+		return peak_rss()[0]
+
+# median time of a call in milliseconds, after n_warmup calls
+def time_calls(fn, n_repeats, n_warmup=1):
+	for _ in range(n_warmup):
+		fn()
+	times = list()
+	for _ in range(n_repeats):
+		start = time.perf_counter()
+		fn()
+		times.append(time.perf_counter() - start)
+	return 1000.0 * median(times)
+
+# a metric, with whether lower or higher values are better
+def metric(value, unit, lower_is_better=True):
+	return {'value': float(value), 'unit': unit, 'lower_is_better': lower_is_better}
+
+# write random JPEG images of both domains as trainA/ and trainB/ folders
+def write_images(directory, n_images, size):
+	for domain in ('trainA', 'trainB'):
+		makedirs(join(directory, domain), exist_ok=True)
+		for i in range(n_images):
+			pixels = randint(0, 256, (size, size, 3)).astype('uint8')
+			Image.fromarray(pixels).save(join(directory, domain, '%04d.jpg' % i), quality=90)
+
+# decode and resize a folder of images into memory
+def bench_load_images(context, args):
+	from cyclegan.data import load_images
+	source = join(context['workdir'], 'images') + '/'
+	write_images(source, args.images, args.size * 286 // 256)
+	def run():
+		load_images(source + 'trainA/', (args.size, args.size), args.workers)
+	elapsed = time_calls(run, args.repeats, n_warmup=0) / 1000.0
+	return {'load_images': metric(args.images / elapsed, 'images/sec', lower_is_better=False)}
+
+# load the prepared dataset in both formats, and keep the memory-mapped one for the other benchmarks
+def bench_load_real_samples(context, args):
+	from cyclegan.data import load_real_samples
+	from cyclegan.data import save_images
+	# the prepared dataset in both formats, decoded from the images of the load_images benchmark
+	source = join(context['workdir'], 'images') + '/'
+	directory = join(context['workdir'], 'dataset')
+	makedirs(directory, exist_ok=True)
+	dataA = save_images(source + 'trainA/', join(directory, 'A.npy'), (args.size, args.size), args.workers)
+	dataB = save_images(source + 'trainB/', join(directory, 'B.npy'), (args.size, args.size), args.workers)
+	compressed = join(context['workdir'], 'dataset.npz')
+	savez_compressed(compressed, dataA.astype('float32'), dataB.astype('float32'))
+	del dataA, dataB
+	results = dict()
+	for name, filename in (('npy', directory), ('npz', compressed)):
+		before = current_rss()
+		start = time.perf_counter()
+		dataset = load_real_samples(filename)
+		elapsed = time.perf_counter() - start
+		results['load_real_samples_%s' % name] = metric(1000.0 * elapsed, 'ms')
+		results['load_real_samples_%s_rss' % name] = metric(current_rss() - before, 'MB')
+		del dataset
+	# the training benchmarks sample the memory-mapped dataset
+	context['dataset'] = load_real_samples(directory)
+	return results
+
+# sample a batch of real images
+def bench_generate_real_samples(context, args):
+	from cyclegan.data import generate_real_samples
+	from cyclegan.config import patch_size
+	trainA = context['dataset'][0]
+	n_patch = patch_size(args.size, context['config']['d_layers'])
+	ms = time_calls(lambda: generate_real_samples(trainA, args.batch, n_patch), args.repeats)
+	return {'generate_real_samples': metric(ms, 'ms')}
+
+# sample a batch of augmented real images, cropped like the 'paper' preset crops 256 pixels out of 286
+def bench_augment_images(context, args):
+	from cyclegan.data import augment_images
+	from numpy.random import default_rng
+	trainA = context['dataset'][0]
+	size, rng = args.size * 256 // 286, default_rng(args.seed)
+	def run(jitter):
+		augment_images(trainA, rng.integers(0, len(trainA), args.batch), size, rng, True, jitter)
+	return {'augment_images': metric(time_calls(lambda: run(0.0), args.repeats), 'ms'),
+		'augment_images_jitter': metric(time_calls(lambda: run(0.1), args.repeats), 'ms')}
+
+# pass a batch of fakes through a full pool
+def bench_update_image_pool(context, args):
+	from cyclegan.data import ImagePool
+	from cyclegan.data import scale_images
+	from cyclegan.data import update_image_pool
+	pool = ImagePool()
+	fakes = scale_images(context['dataset'][0][:args.batch])
+	# fill the pool first, then every update swaps images
+	while pool.n_images < pool.max_size:
+		update_image_pool(pool, fakes)
+	ms = time_calls(lambda: update_image_pool(pool, fakes), args.repeats)
+	return {'update_image_pool': metric(ms, 'ms')}
+
+# call a generator and a discriminator, and keep the models for the other benchmarks
+def bench_forward(context, args):
+	import tensorflow as tf
+	from cyclegan.data import scale_images
+	from cyclegan.models import define_models
+	context['models'] = define_models((args.size, args.size, 3), config=context['config'])
+	d_model_A, _, g_model_AtoB, _, _, _ = context['models']
+	X = tf.constant(scale_images(context['dataset'][0][:args.batch]))
+	results = dict()
+	for name, model in (('generator_forward', g_model_AtoB), ('discriminator_forward', d_model_A)):
+		forward = tf.function(lambda X, model=model: model(X, training=False))
+		results[name] = metric(time_calls(lambda: forward(X).numpy(), args.repeats), 'ms')
+	return results
+
+# one iteration with the compiled models
+def bench_train_iteration(context, args):
+	from cyclegan.data import ImagePool
+	from cyclegan.data import generate_real_samples
+	from cyclegan.data import update_image_pool
+	from cyclegan.training import generate_fake_samples
+	d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB, c_model_BtoA = context['models']
+	trainA, trainB = context['dataset']
+	n_patch = d_model_A.output_shape[1]
+	poolA, poolB = ImagePool(), ImagePool()
+	# the body of the train() loop with the compiled models
+	def iteration():
+		X_realA, y_realA = generate_real_samples(trainA, args.batch, n_patch)
+		X_realB, y_realB = generate_real_samples(trainB, args.batch, n_patch)
+		X_fakeA, y_fakeA = generate_fake_samples(g_model_BtoA, X_realB, n_patch)
+		X_fakeB, y_fakeB = generate_fake_samples(g_model_AtoB, X_realA, n_patch)
+		X_fakeA = update_image_pool(poolA, X_fakeA)
+		X_fakeB = update_image_pool(poolB, X_fakeB)
+		c_model_BtoA.train_on_batch([X_realB, X_realA], [y_realA, X_realA, X_realB, X_realA])
+		d_model_A.train_on_batch(X_realA, y_realA)
+		d_model_A.train_on_batch(X_fakeA, y_fakeA)
+		c_model_AtoB.train_on_batch([X_realA, X_realB], [y_realB, X_realB, X_realA, X_realB])
+		d_model_B.train_on_batch(X_realB, y_realB)
+		d_model_B.train_on_batch(X_fakeB, y_fakeB)
+	ms = time_calls(iteration, args.repeats)
+	return {'train_iteration': metric(ms, 'ms'),
+		'train_throughput': metric(1000.0 * args.batch / ms, 'images/sec', lower_is_better=False)}
+
+# one iteration with the fused training step
+def bench_fused_iteration(context, args):
+	from cyclegan.data import BatchProvider
+	from cyclegan.data import ImagePool
+	from cyclegan.training import define_train_step
+	d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, _, _ = context['models']
+	trainA, trainB = context['dataset']
+	train_step = define_train_step(g_model_AtoB, g_model_BtoA, d_model_A, d_model_B)
+	batches = BatchProvider(trainA, trainB, args.batch, d_model_A.output_shape[1], n_prefetch=0)
+	poolA, poolB = ImagePool(), ImagePool()
+	# the body of the train() loop with the fused step
+	def iteration():
+		X_realA, X_realB = batches.next()
+		sourceA, historyA = poolA.select(args.batch, X_realA.shape[1:])
+		sourceB, historyB = poolB.select(args.batch, X_realB.shape[1:])
+		results = train_step(X_realA, X_realB, sourceA, historyA, sourceB, historyB)
+		poolA.push(results[6].numpy())
+		poolB.push(results[7].numpy())
+	ms = time_calls(iteration, args.repeats)
+	return {'fused_iteration': metric(ms, 'ms'),
+		'fused_throughput': metric(1000.0 * args.batch / ms, 'images/sec', lower_is_better=False)}
+
+# save both generators
+def bench_save_models(context, args):
+	from cyclegan.training import save_models
+	_, _, g_model_AtoB, g_model_BtoA, _, _ = context['models']
+	# save_models() writes to the working directory
+	cwd = os.getcwd()
+	os.chdir(context['workdir'])
+	try:
+		ms = time_calls(lambda: save_models(0, g_model_AtoB, g_model_BtoA), args.repeats, n_warmup=0)
+	finally:
+		os.chdir(cwd)
+	return {'save_models': metric(ms, 'ms')}
+
+# the benchmarks in the order they run, later ones use the dataset and models of earlier ones
+BENCHMARKS = [
+	('load_images', bench_load_images),
+	('load_real_samples', bench_load_real_samples),
+	('generate_real_samples', bench_generate_real_samples),
+	('augment_images', bench_augment_images),
+	('update_image_pool', bench_update_image_pool),
+	('forward', bench_forward),
+	('train_iteration', bench_train_iteration),
+	('fused_iteration', bench_fused_iteration),
+	('save_models', bench_save_models)]
+
+# the commit of the repository, or None outside of git
+def git_commit():
+	try:
+		return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, check=True, stdout=subprocess.PIPE,
+			stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+# run the benchmarks, returns the results with the settings they were measured with
+def run_suite(args):
+	seed(args.seed)
+	results = dict()
+	with tempfile.TemporaryDirectory() as workdir:
+		context = {'workdir': workdir, 'config': get_config(args.preset, image_size=args.size, n_batch=args.batch)}
+		for name, bench in BENCHMARKS:
+			# the later benchmarks depend on the earlier ones, so only the reporting is skipped
+			start = time.time()
+			measured = bench(context, args)
+			if args.only is None or name in args.only:
+				results.update(measured)
+				print('>%s done in %.1fs' % (name, time.time() - start))
+	import tensorflow as tf
+	settings = {'preset': args.preset, 'size': args.size, 'batch': args.batch, 'images': args.images,
+		'repeats': args.repeats}
+	meta = {'commit': git_commit(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': platform.python_version(),
+		'tensorflow': tf.__version__, 'platform': platform.platform(), 'cpus': os.cpu_count()}
+	return {'settings': settings, 'meta': meta, 'results': results}
+
+# print the results, compared with a baseline when one is given, returns the names of the regressed metrics
+def report(run, baseline=None, tolerance=0.1, min_change=0.05):
+	regressions = list()
+	print('%-28s %12s %12s %9s  %s' % ('metric', 'value', 'baseline', 'change', 'unit'))
+	for name, result in sorted(run['results'].items()):
+		old = baseline['results'].get(name) if baseline is not None else None
+		if old is None:
+			print('%-28s %12.2f %12s %9s  %s' % (name, result['value'], '-', '-', result['unit']))
+			continue
+		change = (result['value'] - old['value']) / old['value'] if old['value'] else 0.0
+		worse = change > tolerance if result['lower_is_better'] else change < -tolerance
+		# metrics close to zero, like the memory of a memory map, only regress by a meaningful amount
+		worse = worse and abs(result['value'] - old['value']) > min_change
+		if worse:
+			regressions.append(name)
+		print('%-28s %12.2f %12.2f %+8.1f%%  %s%s' % (name, result['value'], old['value'], 100.0 * change,
+			result['unit'], '  REGRESSION' if worse else ''))
+	return regressions
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Benchmark the CycleGAN hot paths on the CPU with synthetic data')
+	parser.add_argument('--preset', default='default', choices=sorted(PRESETS), help='models of this preset')
+	parser.add_argument('--size', type=int, default=128, help='image height and width, in place of the preset size')
+	parser.add_argument('--batch', type=int, default=1, help='images per batch')
+	parser.add_argument('--images', type=int, default=64, help='images per domain')
+	parser.add_argument('--repeats', type=int, default=10, help='timed runs per benchmark')
+	parser.add_argument('--workers', type=int, default=None, help='number of decode processes')
+	parser.add_argument('--seed', type=int, default=1)
+	parser.add_argument('--only', nargs='+', default=None, choices=[name for name, _ in BENCHMARKS],
+		help='report only these benchmarks')
+	parser.add_argument('--output', default=None, help='json file for the results')
+	parser.add_argument('--compare', default=None, help='json file of earlier results to check for regressions')
+	parser.add_argument('--tolerance', type=float, default=0.1, help='allowed slowdown as a fraction')
+	parser.add_argument('--min-change', type=float, default=0.05, help='smallest absolute change counted as a regression')
+	args = parser.parse_args()
+	# keep TensorFlow on the CPU, before it is imported by the first benchmark
+	os.environ['CUDA_VISIBLE_DEVICES'] = '-1'
+	baseline = None
+	if args.compare is not None:
+		with open(args.compare) as f:
+			baseline = json.load(f)
+		for key in ('preset', 'size', 'batch'):
+			if baseline['settings'].get(key, 'default') != getattr(args, key):
+				parser.error('%s is %s in %s, not %s' % (key, baseline['settings'][key], args.compare, getattr(args, key)))
+	run = run_suite(args)
+	regressions = report(run, baseline, args.tolerance, args.min_change)
+	if args.output is not None:
+		with open(args.output, 'w') as f:
+			json.dump(run, f, indent=1)
+	if regressions:
+		print('>%d regressions: %s' % (len(regressions), ' '.join(regressions)))
+		sys.exit(1)
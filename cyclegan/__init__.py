@@ -0,0 +1,15 @@
+# CycleGAN to translate horses to zebras
+'''
+The project is split into modules that are imported only when they are needed:
+	config      the presets of the architecture and training schedule, plain Python
+	data        building the dataset and sampling it, NumPy and Pillow only
+	models      the generators, discriminators and composite models
+	training    the training loop, checkpoints and metrics
+	inference   batch translation with a trained generator, NumPy and Pillow only
+	serving     loading a generator from an .h5 file or from an exported artifact
+	export      exporting a generator as an optimized SavedModel or TFLite model
+	evaluation  FID and KID of the generators on the held out test images
+
+The entry points prepare.py, train.py, infer.py, evaluate.py and export.py parse their arguments before importing any of
+these, so --help answers at once, and only the ones that build or load a model pay for importing TensorFlow.
+'''
@@ -0,0 +1,110 @@
+# Configuring the architecture and the training schedule
+'''
+The sizes of the models and the training schedule are held in a config, a plain dictionary of the settings below, so
+that the entry points can choose them before TensorFlow is imported. get_config() starts from a preset and applies
+overrides on top of it:
+	image_size    height and width of the images, a multiple of 4 as the generator downsamples twice
+	load_size     height and width of the prepared images that are randomly cropped to image_size, the same as
+	              image_size when it is None, which turns cropping off
+	flip          mirror half of the training images horizontally
+	jitter        strength of the random brightness, contrast and saturation changes of the training images, 0 for none
+	g_filters     filters of the first generator layer, the generator is g_filters-2x-4x wide with 4x resnet blocks
+	n_resnet      number of resnet blocks of the generator
+	d_filters     filters of the first discriminator layer, doubled at each downsampling up to 8x
+	d_layers      number of downsampling convolutions of the discriminator
+	n_batch       images per training step, or per micro-batch with gradient accumulation
+	n_accum       micro-batches whose gradients are averaged into each update of the fused step, 1 for none
+	n_epochs      number of epochs, each of len(trainA) / (n_batch * n_accum) updates
+	lr            learning rate of every Adam optimizer
+	beta_1        beta_1 of every Adam optimizer
+	decay_epochs  the learning rate decays linearly towards zero over the last decay_epochs epochs, 0 keeps it constant
+	plot_every    epochs between sample plots
+	save_every    epochs between saved generators and checkpoints
+	pool_size     images in the pool of fakes of each discriminator
+
+The presets trade quality for throughput:
+	'default'  the models and schedule this project has always trained, 256x256 images, 9 resnet blocks and 100 epochs
+	           at a constant learning rate
+	'paper'    the schedule and augmentation of the CycleGAN paper, 100 epochs at a constant learning rate then 100
+	           epochs of linear decay, on random 256x256 crops of images prepared at 286x286 that are flipped at random
+	'fast'     128x128 images and 6 resnet blocks, the generator the paper uses for 128x128 images, less than a quarter of
+	           the work per step of 'default'
+	'debug'    tiny models on 64x64 images for a quick end-to-end run
+
+The PatchGAN output of the discriminator has one value per patch. Every downsampling convolution uses 'same' padding
+with a stride of 2, which rounds odd sizes up, and the two last convolutions keep the size, so patch_size() gives the
+side of the output for any image size and number of downsampling layers: 16 for 256x256 images with 4 layers, 8 for
+128x128 images.
+'''
+
+# the settings every preset starts from
+DEFAULTS = {
+	'image_size': 256,
+	'load_size': None,
+	'flip': False,
+	'jitter': 0.0,
+	'g_filters': 64,
+	'n_resnet': 9,
+	'd_filters': 64,
+	'd_layers': 4,
+	'n_batch': 1,
+	'n_accum': 1,
+	'n_epochs': 100,
+	'lr': 0.0002,
+	'beta_1': 0.5,
+	'decay_epochs': 0,
+	'plot_every': 1,
+	'save_every': 5,
+	'pool_size': 50}
+
+# the settings of each preset that differ from the defaults
+PRESETS = {
+	'default': {},
+	'paper': {'n_epochs': 200, 'decay_epochs': 100, 'load_size': 286, 'flip': True},
+	'fast': {'image_size': 128, 'n_resnet': 6},
+	'debug': {'image_size': 64, 'g_filters': 16, 'n_resnet': 2, 'd_filters': 16, 'd_layers': 3, 'n_epochs': 2}}
+
+# the config of a preset with some of its settings replaced, None values are ignored
+def get_config(preset='default', **overrides):
+	if preset not in PRESETS:
+		raise ValueError('Unknown preset: %s' % preset)
+	config = dict(DEFAULTS)
+	config.update(PRESETS[preset])
+	for name, value in overrides.items():
+		if name not in DEFAULTS:
+			raise ValueError('Unknown setting: %s' % name)
+		if value is not None:
+			config[name] = value
+	if config['load_size'] is None:
+		config['load_size'] = config['image_size']
+	check_config(config)
+	return config
+
+# raise a ValueError for settings that cannot work together
+def check_config(config):
+	if config['image_size'] % 4 != 0:
+		raise ValueError('image_size=%d is not a multiple of 4' % config['image_size'])
+	if config['load_size'] < config['image_size']:
+		raise ValueError('load_size=%d is smaller than image_size=%d' % (config['load_size'], config['image_size']))
+	if not 0 <= config['jitter'] < 1:
+		raise ValueError('jitter=%g is not between 0 and 1' % config['jitter'])
+	for name in ('g_filters', 'd_filters', 'd_layers', 'n_batch', 'n_accum', 'n_epochs', 'plot_every', 'save_every',
+			'pool_size'):
+		if config[name] < 1:
+			raise ValueError('%s=%d has to be at least 1' % (name, config[name]))
+	if config['n_resnet'] < 0:
+		raise ValueError('n_resnet=%d has to be at least 0' % config['n_resnet'])
+	if not 0 <= config['decay_epochs'] <= config['n_epochs']:
+		raise ValueError('decay_epochs=%d is not between 0 and n_epochs=%d' % (config['decay_epochs'], config['n_epochs']))
+
+# side of the square PatchGAN output of the discriminator
+def patch_size(image_size, d_layers=4):
+	for _ in range(d_layers):
+		# a 'same' convolution with a stride of 2 rounds up
+		image_size = (image_size + 1) // 2
+	return image_size
+
+# learning rate of an epoch, constant and then decaying linearly over the last decay_epochs epochs
+def learning_rate(epoch, config):
+	n_constant = config['n_epochs'] - config['decay_epochs']
+	return config['lr'] * (1.0 - max(0, epoch + 1 - n_constant) / (config['decay_epochs'] + 1.0))
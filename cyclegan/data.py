@@ -0,0 +1,753 @@
+# Preparing and sampling the horses and zebra dataset
+'''
+The "A" refers to horse and "B" refers to zebra.
+Below we will load all photographs from the train folders and create an array of images for category A and another for
+category B. The test folders are kept apart as two more arrays, held out from training for the evaluation in
+evaluation.py. The arrays are then saved either to a new file in compressed NumPy array format, or to a directory of
+uncompressed uint8 .npy files (A.npy, B.npy, testA.npy and testB.npy) that training can memory-map instead of loading
+the whole corpus into memory.
+
+This module only needs NumPy and Pillow, so preparing the dataset and feeding the training loop never wait for
+TensorFlow to be imported. Images are decoded with Pillow exactly as keras.preprocessing.image.load_img() does, in RGB
+and resized with nearest neighbour interpolation, so the arrays are the same as the ones built with Keras.
+
+Building the dataset is incremental. A small JSON manifest maps every row of the arrays back to its source file, with
+the SHA-256 hash of the file, its size and modification time, and a 64 bit difference hash of the decoded image. A rerun
+only hashes the files whose size or modification time changed and only decodes the files with new content. The rows of
+unchanged files stay where they are and new images are appended to the end of the .npy files in place, an array is only
+rewritten when some of its files were removed or changed. An up to date dataset is checked from the file metadata
+alone, in a fraction of a second. A compressed .npz file cannot be appended to and is rebuilt whenever an image changes.
+
+Duplicates are dropped and listed in the manifest with the file they duplicate and its hash: exact duplicates, files
+with the same SHA-256 hash that are never decoded, and near duplicates, images whose difference hashes differ in at most
+NEAR_DUPLICATE_BITS bits such as a resized or recompressed copy. The training images of a domain are checked before its
+test images, so a test image that duplicates a training image is dropped from the test set instead of leaking into the
+evaluation. A refresh compares the new images with the kept ones, and the rows kept by the last run only with the images
+added before them, so its cost grows with the number of new images rather than with the size of the domain.
+
+The manifest is removed before any array is modified and written last, so a run never trains on arrays that are stale
+or only half written. An interrupted update is rebuilt from scratch by the next run.
+'''
+import sys
+import json
+import time
+import hashlib
+import resource
+from io import BytesIO
+from functools import partial
+from multiprocessing import Pool
+from os import listdir
+from os import makedirs
+from os import remove
+from os import replace
+from os import stat
+from os.path import exists
+from os.path import join
+from shutil import copyfileobj
+from queue import Full
+from queue import Queue
+from threading import Event
+from threading import Thread
+from numpy import load
+from numpy import save
+from numpy import savez_compressed
+from numpy import flatnonzero
+from numpy import zeros
+from numpy import arange
+from numpy import ones
+from numpy import asarray
+from numpy import clip
+from numpy import prod
+from numpy import frombuffer
+from numpy import packbits
+from numpy import unpackbits
+from numpy.lib.format import open_memmap
+from numpy.lib.format import read_magic
+from numpy.lib.format import read_array_header_1_0
+from numpy.lib.format import read_array_header_2_0
+from numpy.lib.format import write_array_header_1_0
+from numpy.lib.format import write_array_header_2_0
+from numpy.lib.format import dtype_to_descr
+from numpy.lib.stride_tricks import as_strided
+from numpy.random import randint
+from numpy.random import rand
+from numpy.random import default_rng
+from PIL import Image
+
+# bump when the preprocessing or the manifest changes, so that older datasets are rebuilt
+DATASET_VERSION = 4
+# images whose difference hashes differ in at most this many of their 64 bits are near duplicates
+NEAR_DUPLICATE_BITS = 4
+# the number of set bits of every byte, for NumPy before 2.0 which has no bitwise_count()
+BIT_COUNTS = unpackbits(arange(256, dtype='uint8')[:, None], axis=1).sum(axis=1).astype('uint8')
+
+# Load and resize a single image, kept as uint8 so that workers send back a quarter of the bytes. A size of None keeps
+# the image at its full resolution
+def load_image(filename, size=(256,256)):
+	with Image.open(filename) as image:
+		image = image.convert('RGB')
+		# size is (height, width), Pillow takes (width, height)
+		if size is not None and image.size != (size[1], size[0]):
+			image = image.resize((size[1], size[0]), Image.NEAREST)
+		return asarray(image, dtype='uint8')
+
+# Load an image like load_image(), returns the filename with the pixels or with the error instead of raising it
+def decode_image(filename, size=(256,256)):
+	try:
+		return filename, load_image(filename, size), None
+	except Exception as e:
+		return filename, None, str(e)
+
+# List the files in one or more directories in name order, assume all are images
+def list_images(paths):
+	if isinstance(paths, str):
+		paths = [paths]
+	return [path + filename for path in paths for filename in sorted(listdir(path))]
+
+# Decode and resize images in a pool of worker processes straight into a preallocated array
+def decode_images(filenames, out, size=(256,256), n_workers=None, chunksize=16):
+	# imap keeps the order of the filenames
+	with Pool(n_workers) as pool:
+		for i, pixels in enumerate(pool.imap(partial(load_image, size=size), filenames, chunksize)):
+			out[i] = pixels
+	return out
+
+# Load all images in one or more directories into memory
+def load_images(paths, size=(256,256), n_workers=None):
+	filenames = list_images(paths)
+	# allocate the output once instead of stacking a list of arrays
+	data = zeros((len(filenames), size[0], size[1], 3), dtype='float32')
+	return decode_images(filenames, data, size, n_workers)
+
+# Load all images in one or more directories into a uint8 .npy file on disk
+def save_images(paths, filename, size=(256,256), n_workers=None):
+	filenames = list_images(paths)
+	# the array is written through the memory map, so the domain never has to fit in memory
+	data = open_memmap(filename, mode='w+', dtype='uint8', shape=(len(filenames), size[0], size[1], 3))
+	decode_images(filenames, data, size, n_workers)
+	data.flush()
+	return data
+
+# Peak resident set size in MB of this process and of its largest worker
+def peak_rss():
+	# ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+	scale = 1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0
+	main = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+	workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale
+	return main, workers
+
+# 64 bit difference hash of an image as 16 hex digits, the signs of the horizontal gradients of a 9x8 grayscale
+# thumbnail. A resized, recompressed or lightly retouched copy of an image has a hash that differs in only a few bits
+def difference_hash(pixels):
+	thumbnail = Image.fromarray(pixels).convert('L').resize((9, 8), Image.BILINEAR)
+	thumbnail = asarray(thumbnail, dtype='int16')
+	return packbits(thumbnail[:, 1:] > thumbnail[:, :-1]).tobytes().hex()
+
+# Load an image like load_image(), returns the pixels with their difference hash
+def decode_hashed(filename, size=(256,256)):
+	pixels = load_image(filename, size)
+	return pixels, difference_hash(pixels)
+
+# 64 bit difference hash given as hex digits, as an integer to compare with others
+def hash_value(dhash):
+	return frombuffer(bytes.fromhex(dhash), dtype='uint64')[0]
+
+# The number of bits in which each of an array of 64 bit hashes differs from one hash
+def hamming_distances(hashes, value):
+	try:
+		from numpy import bitwise_count
+	except ImportError:
+		return BIT_COUNTS[(hashes ^ value).view('uint8').reshape(-1, 8)].sum(axis=1, dtype='uint8')
+	return bitwise_count(hashes ^ value)
+
+# SHA-256 hash of the bytes of a file
+def file_hash(filename):
+	digest = hashlib.sha256()
+	with open(filename, 'rb') as f:
+		for block in iter(lambda: f.read(1 << 20), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+# the arrays of a dataset directory, the training images of both domains and the held out test images
+ARRAYS = ['A', 'B', 'testA', 'testB']
+# the folder of the source images of each array
+FOLDERS = {'A': 'trainA/', 'B': 'trainB/', 'testA': 'testA/', 'testB': 'testB/'}
+# the arrays of each domain, the training images first
+DOMAINS = [('A', 'testA'), ('B', 'testB')]
+
+# The source files of an array in name order, by their name relative to path, with their size, modification time and
+# content hash. The hash of a file whose size and modification time are the ones recorded in known is not recomputed
+def scan_files(path, folder, known):
+	files = list()
+	for name in sorted(listdir(path + folder)):
+		status = stat(path + folder + name)
+		entry = {'file': folder + name, 'bytes': status.st_size, 'mtime': status.st_mtime_ns}
+		previous = known.get(entry['file'])
+		if previous is not None and (previous['bytes'], previous['mtime']) == (entry['bytes'], entry['mtime']):
+			entry['sha256'] = previous['sha256']
+		else:
+			entry['sha256'] = file_hash(path + entry['file'])
+		files.append(entry)
+	return files
+
+# The manifest of a dataset, inside the directory or next to the .npz file
+def manifest_filename(filename):
+	if filename.endswith('.npz'):
+		return filename[:-len('.npz')] + '.json'
+	return join(filename, 'manifest.json')
+
+# The manifest of an existing dataset built with the same preprocessing, or None when it is missing, incomplete or was
+# written by another version, for another image size or near-duplicate distance
+def read_manifest(filename, size, max_distance):
+	manifest = manifest_filename(filename)
+	arrays = [filename] if filename.endswith('.npz') else [join(filename, name + '.npy') for name in ARRAYS]
+	if not exists(manifest) or not all(exists(array) for array in arrays):
+		return None
+	with open(manifest) as f:
+		manifest = json.load(f)
+	if (manifest.get('version'), manifest.get('size'), manifest.get('max_distance')) != (DATASET_VERSION, list(size),
+			max_distance):
+		return None
+	return manifest
+
+# Set the number of rows of a .npy file, cutting or extending the file. NumPy leaves room in the header for the first
+# dimension to grow, so the header is rewritten in place and the rows stay where they are
+def resize_npy(filename, n_rows):
+	with open(filename, 'r+b') as f:
+		version = read_magic(f)
+		read_header, write_header = {(1, 0): (read_array_header_1_0, write_array_header_1_0),
+			(2, 0): (read_array_header_2_0, write_array_header_2_0)}[version]
+		shape, fortran_order, dtype = read_header(f)
+		offset = f.tell()
+		header = BytesIO()
+		write_header(header, {'descr': dtype_to_descr(dtype), 'fortran_order': fortran_order,
+			'shape': (n_rows,) + shape[1:]})
+		header = header.getvalue()
+		n_bytes = len(header) + n_rows * dtype.itemsize * int(prod(shape[1:]))
+		if len(header) == offset:
+			f.seek(0)
+			f.write(header)
+			f.truncate(n_bytes)
+			return
+	# the header of an older NumPy has no room to grow, copy the rows behind the new one
+	with open(filename, 'rb') as f, open(filename + '.tmp', 'wb') as out:
+		out.write(header)
+		f.seek(offset)
+		copyfileobj(f, out)
+		out.truncate(n_bytes)
+	replace(filename + '.tmp', filename)
+
+# The uint8 array of an image domain being updated. The rows of the old .npy file listed in keep stay in front, in place
+# when they are all of its rows, otherwise the array is rewritten without the others. Room is made for n_new rows in
+# self.new, and close() keeps the first n_added of them. Without a filename the array is held in memory
+class ImageStore:
+	def __init__(self, filename, keep, n_new, image_shape):
+		self.filename, self.n_kept = filename, len(keep)
+		shape = (len(keep) + n_new,) + tuple(image_shape)
+		if filename is None:
+			self.target, self.data = None, zeros(shape, dtype='uint8')
+		elif exists(filename) and list(keep) == list(range(len(load(filename, mmap_mode='r')))):
+			# every old row is kept, the new ones are appended to the file
+			self.target = filename
+			resize_npy(filename, shape[0])
+			self.data = load(filename, mmap_mode='r+')
+		else:
+			self.target = filename + '.tmp.npy'
+			self.data = open_memmap(self.target, mode='w+', dtype='uint8', shape=shape)
+			if len(keep) > 0:
+				old = load(filename, mmap_mode='r')
+				# copied in chunks, so the domain never has to fit in memory
+				for i in range(0, len(keep), 256):
+					self.data[i:i + len(keep[i:i + 256])] = old[keep[i:i + 256]]
+				del old
+		self.new = self.data[self.n_kept:]
+
+	# keep the first n_added new rows, returns the array
+	def close(self, n_added):
+		if self.target is None:
+			return self.data[:self.n_kept + n_added]
+		self.data.flush()
+		del self.data, self.new
+		resize_npy(self.target, self.n_kept + n_added)
+		if self.target != self.filename:
+			replace(self.target, self.filename)
+		return load(self.filename, mmap_mode='r')
+
+# Update the arrays of one domain, the training images before the test images. Every image is checked against the ones
+# kept before it: a file with the same content hash is an exact duplicate and is never decoded, an image whose
+# difference hash is at most max_distance bits away from a kept one is a near duplicate. Duplicates are dropped and
+# recorded with the file they duplicate and its content hash. A row kept by the last run was checked against every row
+# before it then, and removing rows never makes it a duplicate, so it is only checked against the rows added before it
+# since. Returns the arrays and their manifest entries
+def update_domain(path, filename, names, files, old, size, pool, max_distance):
+	# the kept rows of the domain, by content hash and in order with their difference hashes, and the positions of the
+	# ones that were not kept by the last run
+	kept, rows_kept, added = dict(), list(), list()
+	n_rows = sum(len(files[name]) for name in names)
+	hashes, is_added = zeros(n_rows, dtype='uint64'), zeros(n_rows, dtype=bool)
+	# the kept row with the same content, or within max_distance bits of the difference hash of a row, among all the
+	# kept rows or only the ones added by this run
+	def find_duplicate(row, only_added=False):
+		ix = kept.get(row['sha256'])
+		if ix is not None and (is_added[ix] or not only_added):
+			return rows_kept[ix]
+		among = hashes[added] if only_added else hashes[:len(rows_kept)]
+		if max_distance >= 0 and len(among) > 0:
+			distances = hamming_distances(among, hash_value(row['dhash']))
+			if distances.min() <= max_distance:
+				ix = int(distances.argmin())
+				return rows_kept[added[ix] if only_added else ix]
+		return None
+	# the manifest entry of a dropped row, with the file it duplicates and the content of that file
+	def dropped_row(row, duplicate):
+		return dict(row, of=duplicate['file'], of_sha256=duplicate['sha256'])
+	# add a row to the images kept in the domain, new unless it was kept by the last run
+	def add(row, new=True):
+		if new:
+			added.append(len(rows_kept))
+			is_added[len(rows_kept)] = True
+		hashes[len(rows_kept)] = hash_value(row['dhash'])
+		kept[row['sha256']] = len(rows_kept)
+		rows_kept.append(row)
+	results, n_decoded = list(), 0
+	for name in names:
+		entry = old['arrays'][name] if old is not None else {'rows': [], 'dropped': []}
+		current = {(f['file'], f['sha256']) for f in files[name]}
+		rows, dropped, keep, candidates = list(), list(), list(), list()
+		# the old rows of files that are unchanged and still not duplicates stay where they are
+		for i, row in enumerate(entry['rows']):
+			if (row['file'], row['sha256']) not in current:
+				continue
+			duplicate = find_duplicate(row, only_added=True) if added else None
+			if duplicate is None:
+				keep.append(i)
+				rows.append(row)
+				add(row, new=False)
+			else:
+				dropped.append(dropped_row(row, duplicate))
+		# files dropped before stay dropped while the file they duplicate is kept with the same content, the others are
+		# checked again without decoding them
+		in_rows = {(row['file'], row['sha256']) for row in entry['rows']}
+		was_dropped = {(row['file'], row['sha256']): row for row in entry['dropped']}
+		kept_keys = {(row['file'], row['sha256']) for row in rows_kept}
+		for f in files[name]:
+			key = (f['file'], f['sha256'])
+			if key in in_rows:
+				continue
+			if key in was_dropped and (was_dropped[key]['of'], was_dropped[key]['of_sha256']) in kept_keys:
+				dropped.append(dict(was_dropped[key]))
+				continue
+			if key in was_dropped or f['sha256'] in kept:
+				known = was_dropped[key] if key in was_dropped else rows_kept[kept[f['sha256']]]
+				row = dict(f, dhash=known['dhash'])
+				duplicate = find_duplicate(row)
+				if duplicate is not None:
+					dropped.append(dropped_row(row, duplicate))
+					continue
+			candidates.append(f)
+		# decode one file of each content hash, the others are exact duplicates of it
+		first = dict()
+		for f in candidates:
+			first.setdefault(f['sha256'], f)
+		unique = list(first.values())
+		store = ImageStore(None if filename.endswith('.npz') else join(filename, name + '.npy'), keep,
+			len(unique), (size[0], size[1], 3))
+		n_added = 0
+		# the difference hash of each decoded content, and the kept row with that content or the one it duplicates
+		outcomes = dict()
+		decoded = pool.imap(partial(decode_hashed, size=size), [path + f['file'] for f in unique], 16)
+		for f, (pixels, dhash) in zip(unique, decoded):
+			row = dict(f, dhash=dhash)
+			duplicate = find_duplicate(row)
+			if duplicate is None:
+				store.new[n_added] = pixels
+				n_added += 1
+				rows.append(row)
+				add(row)
+			else:
+				dropped.append(dropped_row(row, duplicate))
+			outcomes[f['sha256']] = (dhash, duplicate or row)
+		# the other files of each content point at the kept row
+		for f in candidates:
+			if f is not first[f['sha256']]:
+				dhash, duplicate = outcomes[f['sha256']]
+				dropped.append(dropped_row(dict(f, dhash=dhash), duplicate))
+		data = store.close(n_added)
+		n_decoded += len(unique)
+		print('%-5s %5d images, %d decoded, %d added, %d removed, %d duplicates dropped' % (name, len(data),
+			len(unique), n_added, len(entry['rows']) - len(keep), len(dropped)))
+		results.append((data, {'rows': rows, 'dropped': dropped}))
+	return results, n_decoded
+
+# Build or update the dataset of both domains, the train and the test images apart. A filename ending in .npz is saved
+# as compressed uint8 NumPy arrays, rebuilt in full when any image changed, anything else is a directory of
+# memory-mappable uint8 arrays updated in place. Only new and changed files are decoded, unless force is set, and
+# images at most max_distance bits apart are near duplicates, a negative distance keeps them. Returns the training
+# images
+def build_dataset(path, filename, size=(256,256), n_workers=None, force=False, max_distance=NEAR_DUPLICATE_BITS):
+	start = time.time()
+	old = None if force else read_manifest(filename, size, max_distance)
+	# hash the source files, reusing the hashes of the ones whose size and modification time did not change
+	known = dict()
+	if old is not None:
+		for name in ARRAYS:
+			known.update((row['file'], row) for row in old['arrays'][name]['rows'] + old['arrays'][name]['dropped'])
+	files = {name: scan_files(path, FOLDERS[name], known) for name in ARRAYS}
+	if old is not None and all({(f['file'], f['sha256']) for f in files[name]} == {(row['file'], row['sha256'])
+			for row in old['arrays'][name]['rows'] + old['arrays'][name]['dropped']} for name in ARRAYS):
+		print('Dataset is up to date (checked in %.1fs): %s' % (time.time() - start, filename))
+		return load_real_samples(filename)
+	# a compressed file cannot be appended to
+	if filename.endswith('.npz'):
+		old = None
+	else:
+		makedirs(filename, exist_ok=True)
+	# invalidate the old dataset before modifying any of it
+	if exists(manifest_filename(filename)):
+		remove(manifest_filename(filename))
+	arrays, manifest, n_decoded = dict(), dict(), 0
+	with Pool(n_workers) as pool:
+		for names in DOMAINS:
+			results, n = update_domain(path, filename, names, files, old, size, pool, max_distance)
+			n_decoded += n
+			for name, (data, entry) in zip(names, results):
+				arrays[name], manifest[name] = data, entry
+	# report decode throughput and memory
+	elapsed = time.time() - start
+	print('Decoded %d images in %.1fs (%.1f images/sec), peak RSS %.0f MB, workers %.0f MB'
+		% ((n_decoded, elapsed, n_decoded / elapsed) + peak_rss()))
+	if filename.endswith('.npz'):
+		# save as compressed numpy array
+		savez_compressed(filename, *[arrays[name] for name in ARRAYS])
+	# the manifest is written last, it marks the dataset as complete
+	with open(manifest_filename(filename), 'w') as f:
+		json.dump({'version': DATASET_VERSION, 'size': list(size), 'max_distance': max_distance,
+			'n_images': [len(arrays['A']), len(arrays['B'])], 'n_test': [len(arrays['testA']), len(arrays['testB'])],
+			'arrays': manifest}, f, indent=1)
+	print('Saved dataset:', filename)
+	return arrays['A'], arrays['B']
+
+'''
+We can load our paired images dataset either in compressed NumPy array format or from the directory of uint8 .npy files
+written by build_dataset(). This will return a list of two NumPy arrays: the first for source images and the second for
+corresponding target images. load_test_samples() returns the held out test images of both domains the same way.
+
+The pixels are kept as uint8 in [0,255]. The .npy files are memory-mapped, so loading is near-instant and only the
+pages of the sampled images are ever read into memory. Scaling to [-1,1] float32 is done per batch by
+generate_real_samples() rather than once over the whole dataset, which would hold a float64 copy of both domains.
+'''
+
+
+# load training images as uint8 arrays
+def load_real_samples(filename):
+	if filename.endswith('.npz'):
+		# load the dataset, a compressed file has to be decompressed in full
+		data = load(filename)
+		# unpack arrays
+		X1, X2 = data['arr_0'].astype('uint8'), data['arr_1'].astype('uint8')
+	else:
+		# map the uncompressed arrays without reading them
+		X1 = load(join(filename, 'A.npy'), mmap_mode='r')
+		X2 = load(join(filename, 'B.npy'), mmap_mode='r')
+	return [X1, X2]
+
+# load the held out test images as uint8 arrays
+def load_test_samples(filename):
+	if filename.endswith('.npz'):
+		# only the two test arrays are decompressed
+		data = load(filename)
+		return [data['arr_2'].astype('uint8'), data['arr_3'].astype('uint8')]
+	return [load(join(filename, name + '.npy'), mmap_mode='r') for name in ('testA', 'testB')]
+
+# scale a batch of images from [0,255] to [-1,1] float32
+def scale_images(X):
+	# in place on the float32 copy, rather than allocating a temporary array for each operation
+	X = X.astype('float32')
+	X -= 127.5
+	X /= 127.5
+	return X
+
+# the size x size center of every image of a batch
+def center_crop(X, size):
+	top, left = (X.shape[1] - size) // 2, (X.shape[2] - size) // 2
+	return X[:, top:top + size, left:left + size]
+
+'''
+Each training iteration we will requtire a sample of real images from each domain as input to the discriminator and
+composite generator models. This can be achieved by selecting a random batch of samples.
+
+The generate_real_samples() function implements this, taking a NumPy array for a domain as input and returning the
+requested number of randomly selected images, as well as the target for the PatchGAN discriminator model indicating the
+images are real(target=1.0). As such, the shape of the PatchGAN output is also provided, which in the case of 256x256
+images will be 16, or a 16x16x1 activation map, defined by the patch_shape function argument.
+'''
+
+# select a batch of random samples, returns images and target
+def generate_real_samples(dataset, n_samples, patch_shape):
+	# choose random instances
+	ix = randint(0, dataset.shape[0], n_samples)
+	# retrieve selected images and scale them to [-1,1]
+	X = scale_images(dataset[ix])
+	# generate 'real' class labels (1)
+	y = ones((n_samples, patch_shape, patch_shape, 1))
+	return X, y
+
+'''
+The CycleGAN paper trains on random 256x256 crops of images resized to 286x286, half of them mirrored. The dataset is
+then prepared at the larger load_size, see config.py, and cropped as the batches are drawn, so the stored arrays are
+read as they are and never copied in full.
+
+Cropping a batch is a single NumPy gather: a strided view of the dataset holds every possible crop of every image
+without copying anything, and indexing it with the image, top and left offsets of the batch at once reads only the
+pixels of the crops, straight from the memory map. The mirrored images are then reversed in one assignment. The
+optional color jitter scales the brightness, contrast and saturation of each image by its own random factor, as
+whole-batch array operations on the float32 crops. Nothing loops over the images in Python, so augmenting costs about
+as much as gathering the batch did before.
+
+The random offsets, mirrors and factors come from a NumPy Generator passed in by the caller, so a seeded generator
+gives the same batches on every run.
+'''
+
+# luma weights of the R, G and B channels, as used by PIL to convert to grayscale
+GRAY = asarray([0.299, 0.587, 0.114], dtype='float32')
+
+# gather the images ix of a dataset as random size x size crops, half of them mirrored when flip is set
+def random_crop(dataset, ix, size, rng, flip=False):
+	n_images, height, width, channels = dataset.shape
+	# a view of every size x size window of every image, indexed by image, top and left, which copies nothing
+	strides = dataset.strides
+	windows = as_strided(dataset, (n_images, height - size + 1, width - size + 1, size, size, channels),
+		(strides[0], strides[1], strides[2], strides[1], strides[2], strides[3]), writeable=False)
+	# one gather for the whole batch reads only the pixels of the crops
+	top = rng.integers(0, height - size + 1, len(ix))
+	left = rng.integers(0, width - size + 1, len(ix))
+	X = windows[ix, top, left]
+	if flip:
+		mirror = rng.random(len(ix)) < 0.5
+		X[mirror] = X[mirror, :, ::-1]
+	return X
+
+# randomly change the brightness, contrast and saturation of each image of a batch of [0,255] float32 images in place,
+# by factors between 1-strength and 1+strength
+def color_jitter(X, rng, strength):
+	factors = rng.uniform(1.0 - strength, 1.0 + strength, (3, len(X), 1, 1, 1)).astype('float32')
+	brightness, contrast, saturation = factors
+	X *= brightness
+	# blend with the mean gray level of each image
+	mean = (X @ GRAY).mean(axis=(1, 2))[:, None, None, None]
+	X -= mean
+	X *= contrast
+	X += mean
+	# blend with the gray level of each pixel
+	gray = (X @ GRAY)[..., None]
+	X -= gray
+	X *= saturation
+	X += gray
+	return clip(X, 0.0, 255.0, out=X)
+
+# gather the images ix of a dataset as an augmented batch scaled to [-1,1]
+def augment_images(dataset, ix, size, rng, flip=False, jitter=0.0):
+	if size == dataset.shape[1] == dataset.shape[2] and not flip:
+		X = dataset[ix]
+	else:
+		X = random_crop(dataset, ix, size, rng, flip)
+	if jitter > 0:
+		X = color_jitter(X.astype('float32'), rng, jitter)
+	return scale_images(X)
+
+'''
+Preparing a batch on the training thread leaves the accelerator idle while the host gathers and scales the next images.
+The BatchProvider below moves that work to a background thread that keeps up to n_prefetch batches of real images from
+both domains ready in a queue. With n_prefetch=0 the batches are prepared in the foreground as before, so the speed-up
+can be measured.
+
+Images are drawn either with replacement, like generate_real_samples(), or as shuffled epochs where every image is seen
+once before any is repeated, and augmented with augment_images() when image_size is smaller than the dataset images or
+flip or jitter are set. The draws and the augmentation use a Generator seeded with seed, so the background thread
+produces the same batches in the same order on every run with the same seed. The 'real' and 'fake' PatchGAN targets
+never change between steps, so they are allocated once and shared by every batch.
+'''
+
+# prepare batches of real samples from both domains ahead of the training loop
+class BatchProvider:
+
+	def __init__(self, trainA, trainB, n_batch, patch_shape, n_prefetch=2, sampling='random', image_size=None,
+			flip=False, jitter=0.0, seed=None):
+		if sampling not in ('random', 'epoch'):
+			raise ValueError('Unknown sampling: %s' % sampling)
+		self.datasets = [trainA, trainB]
+		self.n_batch = n_batch
+		self.sampling = sampling
+		# augmentation, random crops of image_size are taken when it is smaller than the images
+		self.image_size = image_size or trainA.shape[1]
+		self.flip = flip
+		self.jitter = jitter
+		self.rng = default_rng(seed)
+		# class labels shared by all batches, 'real' (1) and 'fake' (0)
+		self.y_real = ones((n_batch, patch_shape, patch_shape, 1), dtype='float32')
+		self.y_fake = zeros((n_batch, patch_shape, patch_shape, 1), dtype='float32')
+		# shuffled order and position within the current epoch of each domain
+		self.orders = [self.rng.permutation(len(dataset)) for dataset in self.datasets]
+		self.positions = [0, 0]
+		# start the background thread
+		self.queue = Queue(maxsize=n_prefetch) if n_prefetch > 0 else None
+		self.stopped = Event()
+		self.thread = None
+		if self.queue is not None:
+			self.thread = Thread(target=self._fill, daemon=True)
+			self.thread.start()
+
+	# choose the indices of the next batch of one domain
+	def _indices(self, k):
+		n_images = len(self.datasets[k])
+		if self.sampling == 'random':
+			return self.rng.integers(0, n_images, self.n_batch)
+		ix = list()
+		while len(ix) < self.n_batch:
+			# start a new shuffled epoch once every image has been used
+			if self.positions[k] == n_images:
+				self.orders[k] = self.rng.permutation(n_images)
+				self.positions[k] = 0
+			end = min(n_images, self.positions[k] + self.n_batch - len(ix))
+			ix.extend(self.orders[k][self.positions[k]:end])
+			self.positions[k] = end
+		return asarray(ix)
+
+	# gather, augment and scale the next batch of both domains
+	def sample(self):
+		return [augment_images(dataset, self._indices(k), self.image_size, self.rng, self.flip, self.jitter)
+			for k, dataset in enumerate(self.datasets)]
+
+	# keep the queue full until the provider is closed
+	def _fill(self):
+		while not self.stopped.is_set():
+			try:
+				batch = self.sample()
+			except Exception as e:
+				# hand the error to the training thread instead of leaving it waiting
+				batch = e
+			while not self.stopped.is_set():
+				try:
+					self.queue.put(batch, timeout=0.1)
+					break
+				except Full:
+					pass
+			if isinstance(batch, Exception):
+				return
+
+	# returns the next batch of real images from domain A and domain B
+	def next(self):
+		if self.queue is None:
+			return self.sample()
+		batch = self.queue.get()
+		if isinstance(batch, Exception):
+			raise batch
+		return batch
+
+	# stop the background thread
+	def close(self):
+		self.stopped.set()
+		if self.thread is not None:
+			self.thread.join()
+
+'''
+The discriminator models are updated directly on real and generated images, although in an effort to further manage 
+how quickly the discriminator models learn, a pool of fake images is maintained.
+
+The paper defines an image pool of 50 generated images for each discriminator model that is fist populated and 
+probabilistically either adds new images to the pool by replacing and existing image or uses a generated image directly.
+
+Rather than a Python list of images, each discriminator gets an ImagePool backed by a single preallocated array of
+max_size images. A whole batch of fakes is handled at once: the pool is stocked first, then each remaining image is
+either used directly or swapped with a random image of the pool, with equal probability. The selected images are
+written to an output buffer that is reused every step, so the returned array is only valid until the next update. The
+decision can also be made before the new images exist with select(), and the images stored afterwards with push(),
+which lets the fused training step in training.py apply the pool inside its graph.
+
+A batch gives the same results as passing its images through the pool one at a time, as the paper does. An image that
+swaps a slot stocked or swapped by an earlier image of the same batch gets that earlier image back, not the one that was
+in the pool before the batch, so select() returns for every image the index of the new image to use in its place, or
+-1 for an image from the pool.
+
+The pool contents can be saved and restored with the rest of a training checkpoint.
+'''
+
+# history of generated images for one discriminator
+class ImagePool:
+
+	def __init__(self, max_size=50):
+		self.max_size = max_size
+		self.n_images = 0
+		# the pool and the output buffer are allocated on first use, once the image shape is known
+		self.images = None
+		self.selected = None
+
+	# allocate storage for a batch of images of the given shape
+	def _allocate(self, n_images, image_shape, dtype):
+		if self.images is None:
+			self.images = zeros((self.max_size,) + tuple(image_shape), dtype=dtype)
+		if self.selected is None or len(self.selected) < n_images:
+			self.selected = zeros((n_images,) + tuple(image_shape), dtype=self.images.dtype)
+
+	# decide what happens to the next n_images new images, returns for each image the index of the new image to use in
+	# its place, its own index or that of an earlier image of the batch, or -1 to use the pool image held in a buffer
+	def select(self, n_images, image_shape, dtype='float32'):
+		self._allocate(n_images, image_shape, dtype)
+		selected = self.selected[:n_images]
+		# stock the pool
+		n_stock = min(n_images, self.max_size - self.n_images)
+		# replace an existing image for half of the rest and use replaced image
+		replace = n_stock + flatnonzero(rand(n_images - n_stock) < 0.5)
+		ix = randint(0, self.max_size, len(replace))
+		source = arange(n_images)
+		# the image of this batch stored last in each slot, which is the one an image replacing that slot gets back
+		stored = {self.n_images + i: i for i in range(n_stock)}
+		for k, slot in zip(replace, ix):
+			source[k] = stored.get(slot, -1)
+			stored[slot] = k
+		from_pool = replace[source[replace] < 0]
+		selected[from_pool] = self.images[ix[source[replace] < 0]]
+		self.pending = (n_stock, replace, ix)
+		return source, selected
+
+	# store the new images as decided by the last call to select()
+	def push(self, images):
+		n_stock, replace, ix = self.pending
+		self.images[self.n_images:self.n_images + n_stock] = images[:n_stock]
+		self.n_images += n_stock
+		# when two images replace the same slot the later one is kept
+		self.images[ix] = images[replace]
+
+	# add a batch of images to the pool, returns the images to use for the discriminator update
+	def update(self, images):
+		source, selected = self.select(len(images), images.shape[1:], images.dtype)
+		selected[source >= 0] = images[source[source >= 0]]
+		self.push(images)
+		return selected
+
+	# returns a copy of the images in the pool
+	def get_state(self):
+		if self.images is None:
+			return None
+		return self.images[:self.n_images].copy()
+
+	# restore images returned by get_state()
+	def set_state(self, images):
+		self.images, self.selected, self.n_images = None, None, 0
+		if images is not None and len(images) > 0:
+			self._allocate(len(images), images.shape[1:], images.dtype)
+			self.n_images = len(images)
+			self.images[:self.n_images] = images
+
+	# save the pool to a .npy file
+	def save(self, filename):
+		save(filename, self.get_state() if self.images is not None else zeros((0,)))
+
+	# load a pool saved with save()
+	def load(self, filename):
+		self.set_state(load(filename))
+
+# update image pool for fake images
+def update_image_pool(pool, images):
+	return pool.update(images)
+
@@ -0,0 +1,218 @@
+# Evaluating the generators on the held out test images
+'''
+The sample plots of summarize_performance() show how a run is going, but not whether one generator is better than
+another. This module scores a saved generator on the test images that build_dataset() keeps apart from training, with
+the two usual distances between the features of real and translated images:
+	FID  the Frechet distance between Gaussians fitted to the features of the real target images and of the translated
+	     source images, lower is better
+	KID  the unbiased squared maximum mean discrepancy between the two sets of features with a cubic polynomial kernel,
+	     averaged over random subsets, lower is better and unlike FID not biased by the number of images
+
+The features are the output of a network loaded from a local file, so evaluation never downloads anything. The usual
+choice is InceptionV3 without its classifier, saved once on a machine that can fetch the ImageNet weights:
+
+	python -c "import keras; keras.applications.InceptionV3(include_top=False, pooling='avg').save('inception_v3.h5')"
+
+Any Keras model taking images in [-1,1] works, its output is averaged over the spatial axes when it is not a vector.
+The images are resized to the input size of the network inside the same compiled function.
+
+The images are streamed through the generator and the feature network in batches, and the features of each batch are
+folded into a FeatureStats: the running mean and covariance, merged batch by batch, and a fixed-size random sample of
+the features for KID. The memory needed does not grow with the number of images.
+
+An Evaluator runs the evaluation in a background process, so training never waits for it. train() hands it the
+generators each time it saves them, once the files are written, and the process appends the scores of every saved step
+to a JSON lines file. The process keeps off the GPUs and computes the statistics of the real test images only once.
+'''
+import json
+import time
+from multiprocessing import get_context
+from os import makedirs
+from os.path import join
+from numpy import dot
+from numpy import eye
+from numpy import mean
+from numpy import outer
+from numpy import sqrt
+from numpy import std
+from numpy import trace
+from numpy import zeros
+from numpy import clip
+from numpy.linalg import eigh
+from numpy.random import default_rng
+from keras.models import load_model
+import tensorflow as tf
+from .data import center_crop
+from .data import scale_images
+from .data import load_test_samples
+from .serving import load_generator
+
+# running mean and covariance of a stream of feature vectors, with a random sample of them for KID
+class FeatureStats:
+
+	def __init__(self, max_samples=1000, seed=0):
+		self.n = 0
+		self.mean = None
+		# sum of the outer products of the centered features
+		self.scatter = None
+		# reservoir sample of the features, every feature seen so far is in it with the same probability
+		self.max_samples = max_samples
+		self.samples = None
+		self.rng = default_rng(seed)
+
+	# fold a batch of features into the statistics
+	def update(self, features):
+		features = features.astype('float64')
+		n_batch = len(features)
+		if n_batch == 0:
+			return
+		if self.mean is None:
+			dim = features.shape[1]
+			self.mean, self.scatter = zeros(dim), zeros((dim, dim))
+			self.samples = zeros((self.max_samples, dim), dtype='float32')
+		# merge the mean and scatter of the batch with the running ones
+		batch_mean = features.mean(axis=0)
+		centered = features - batch_mean
+		delta = batch_mean - self.mean
+		n_total = self.n + n_batch
+		self.mean += delta * (n_batch / n_total)
+		self.scatter += dot(centered.T, centered) + outer(delta, delta) * (self.n * n_batch / n_total)
+		# reservoir sampling
+		for i, feature in enumerate(features):
+			seen = self.n + i
+			j = seen if seen < self.max_samples else self.rng.integers(0, seen + 1)
+			if j < self.max_samples:
+				self.samples[j] = feature
+		self.n = n_total
+
+	# unbiased covariance of the features
+	def covariance(self):
+		return self.scatter / max(self.n - 1, 1)
+
+	# the sampled features
+	def sample(self):
+		return self.samples[:min(self.n, self.max_samples)]
+
+# Frechet distance between the Gaussians of two sets of features
+def frechet_distance(stats1, stats2):
+	sigma1, sigma2 = stats1.covariance(), stats2.covariance()
+	# trace of the square root of sigma1 sigma2, from the symmetric sqrt(sigma1) sigma2 sqrt(sigma1)
+	values, vectors = eigh(sigma1)
+	root1 = dot(vectors * sqrt(clip(values, 0, None)), vectors.T)
+	values = eigh(dot(dot(root1, sigma2), root1))[0]
+	covmean_trace = sqrt(clip(values, 0, None)).sum()
+	diff = stats1.mean - stats2.mean
+	return float(dot(diff, diff) + trace(sigma1) + trace(sigma2) - 2.0 * covmean_trace)
+
+# unbiased squared MMD with the kernel (x.y / dim + 1)^3, as mean and standard deviation over random subsets
+def kernel_inception_distance(stats1, stats2, n_subsets=100, subset_size=1000, seed=0):
+	X, Y = stats1.sample().astype('float64'), stats2.sample().astype('float64')
+	m = min(len(X), len(Y), subset_size)
+	if m < 2:
+		return float('nan'), float('nan')
+	dim, rng = X.shape[1], default_rng(seed)
+	off_diagonal = 1.0 - eye(m)
+	values = list()
+	for _ in range(n_subsets):
+		x = X[rng.choice(len(X), m, replace=False)]
+		y = Y[rng.choice(len(Y), m, replace=False)]
+		k_xx = (dot(x, x.T) / dim + 1) ** 3
+		k_yy = (dot(y, y.T) / dim + 1) ** 3
+		k_xy = (dot(x, y.T) / dim + 1) ** 3
+		values.append(((k_xx * off_diagonal).sum() + (k_yy * off_diagonal).sum()) / (m * (m - 1)) - 2 * k_xy.mean())
+	return float(mean(values)), float(std(values))
+
+# load the feature network and return a function mapping a batch of [-1,1] images to feature vectors
+def load_feature_model(filename):
+	model = load_model(filename, compile=False)
+	size = model.input_shape[1:3]
+	@tf.function(input_signature=[tf.TensorSpec((None, None, None, 3), tf.float32)])
+	def extract(X):
+		if None not in size:
+			X = tf.image.resize(X, size, method='bilinear')
+		features = tf.cast(model(X, training=False), tf.float32)
+		# pool feature maps into vectors
+		if len(features.shape) == 4:
+			features = tf.reduce_mean(features, axis=[1, 2])
+		return features
+	return extract
+
+# stream the images of a uint8 array through the optional translation and the feature network into a FeatureStats
+def stream_features(images, extract, size, translate=None, batch_size=25, seed=0):
+	stats = FeatureStats(seed=seed)
+	for start in range(0, len(images), batch_size):
+		# only the images of one batch are read, cropped to the input of the generator and scaled
+		X = scale_images(center_crop(images[start:start + batch_size], size))
+		if translate is not None:
+			X = translate(X)
+		stats.update(extract(X).numpy())
+	return stats
+
+# FID and KID of translated source images against real target images
+def score(real_stats, fake_stats):
+	kid, kid_std = kernel_inception_distance(real_stats, fake_stats)
+	return {'fid': frechet_distance(real_stats, fake_stats), 'kid': kid, 'kid_std': kid_std}
+
+# evaluate saved generators, given as a dict of 'AtoB' and/or 'BtoA' filenames, on the test images of a dataset. The
+# statistics of the real images are kept in real_stats, so that they are only computed once for many generators
+def evaluate_generators(filenames, test_dataset, extract, batch_size=25, real_stats=None):
+	testA, testB = test_dataset
+	real_stats = real_stats if real_stats is not None else dict()
+	results = dict()
+	for direction, filename in sorted(filenames.items()):
+		source, target = (testA, testB) if direction == 'AtoB' else (testB, testA)
+		model, translate = load_generator(filename)
+		size = model.input_shape[1]
+		if (direction, size) not in real_stats:
+			real_stats[direction, size] = stream_features(target, extract, size, batch_size=batch_size)
+		fake_stats = stream_features(source, extract, size, translate, batch_size)
+		results[direction] = score(real_stats[direction, size], fake_stats)
+	return results
+
+# evaluate the generators of each job from the queue and append the scores to log_file, until a None job
+def evaluation_worker(queue, dataset, features, log_file, batch_size):
+	# leave the accelerators to training, before TensorFlow initializes its devices
+	tf.config.set_visible_devices([], 'GPU')
+	test_dataset = load_test_samples(dataset)
+	extract = load_feature_model(features)
+	real_stats = dict()
+	while True:
+		job = queue.get()
+		if job is None:
+			return
+		step, filenames = job
+		start = time.time()
+		try:
+			results = evaluate_generators(filenames, test_dataset, extract, batch_size, real_stats)
+		except Exception as e:
+			# keep evaluating later steps
+			print('>Failed to evaluate step %d: %s' % (step, e))
+			continue
+		record = {'step': step, 'seconds': time.time() - start}
+		record.update(('%s_%s' % (direction, name), value) for direction in results
+			for name, value in results[direction].items())
+		with open(log_file, 'a') as f:
+			f.write(json.dumps(record) + '\n')
+		print('>Evaluated step %d: %s' % (step, ' '.join('%s fid[%.2f] kid[%.4f]' % (direction,
+			results[direction]['fid'], results[direction]['kid']) for direction in sorted(results))))
+
+# evaluates saved generators in a background process
+class Evaluator:
+
+	def __init__(self, dataset, features, log_dir='logs', batch_size=25):
+		makedirs(log_dir, exist_ok=True)
+		# a fresh interpreter, rather than a fork of a process running TensorFlow
+		context = get_context('spawn')
+		self.queue = context.Queue()
+		self.process = context.Process(target=evaluation_worker, args=(self.queue, dataset, features,
+			join(log_dir, 'evaluation.jsonl'), batch_size), daemon=True)
+		self.process.start()
+
+	# queue the generators saved at a step, a dict of 'AtoB' and 'BtoA' filenames
+	def submit(self, step, filenames):
+		self.queue.put((step, filenames))
+
+	# wait for the queued evaluations and stop the process
+	def close(self):
+		self.queue.put(None)
+		self.process.join()
@@ -0,0 +1,103 @@
+# Exporting the generators for serving
+'''
+The .h5 files written by save_models() have to be rebuilt layer by layer by Keras, with the InstanceNormalization layer
+of this project registered, before they can translate anything. For serving, a generator is exported once into an
+artifact that loads as a plain graph instead, see serving.py for the loaders:
+
+	SavedModel  the forward pass in inference mode is traced for images of any size, its weights are folded into the
+	            graph as constants, and the graph is run once through Grappler, the TensorFlow graph optimizer, with
+	            constant folding, arithmetic simplification and op fusion. What is saved is the optimized graph, so
+	            none of this is redone at load time, together with the input shape the generator was trained on.
+	TFLite      the same frozen forward pass converted for the TFLite interpreter, for images of one size, with optional
+	            post-training quantization:
+	              'none'     float32, the same results as the Keras model up to rounding
+	              'float16'  weights stored in float16, half the size
+	              'dynamic'  weights stored in int8 and dequantized on the fly, a quarter of the size
+	              'int8'     weights and activations in int8, calibrated on representative images
+
+check_parity() runs the Keras generator and an exported artifact on the same images and reports the largest and the
+mean absolute difference of the translated images in [-1,1], to be checked against the tolerance of the export format
+in TOLERANCES. Quantized artifacts are expected to differ, by more the fewer bits they keep.
+'''
+import time
+from numpy import abs as absolute
+from numpy import asarray
+import tensorflow as tf
+from tensorflow.core.protobuf import config_pb2
+from tensorflow.core.protobuf import meta_graph_pb2
+from tensorflow.python.framework.convert_to_constants import convert_variables_to_constants_v2
+from tensorflow.python.grappler import tf_optimizer
+
+# largest mean absolute difference from the Keras model accepted for each export format
+TOLERANCES = {'saved_model': 1e-4, 'none': 1e-4, 'float16': 1e-2, 'dynamic': 5e-2, 'int8': 1e-1}
+
+# the forward pass of a model in inference mode with its weights as constants, for batches of images of a given shape
+def frozen_function(model, image_shape=(None, None, 3)):
+	forward = tf.function(lambda images: model(images, training=False))
+	concrete = forward.get_concrete_function(tf.TensorSpec((None,) + tuple(image_shape), tf.float32, name='images'))
+	return convert_variables_to_constants_v2(concrete)
+
+# run the graph of a frozen function through Grappler, returns the optimized GraphDef
+def optimize_graph(frozen):
+	meta_graph = tf.compat.v1.train.export_meta_graph(graph_def=frozen.graph.as_graph_def(), graph=frozen.graph)
+	# Grappler keeps what the outputs need, listed as the fetch nodes
+	fetch = meta_graph_pb2.CollectionDef()
+	fetch.node_list.value.extend(output.name for output in frozen.outputs)
+	meta_graph.collection_def['train_op'].CopyFrom(fetch)
+	config = config_pb2.ConfigProto()
+	rewrites = config.graph_options.rewrite_options
+	rewrites.optimizers.extend(['constfold', 'arithmetic', 'dependency', 'remap'])
+	rewrites.min_graph_nodes = -1
+	return tf_optimizer.OptimizeGraph(config, meta_graph)
+
+# a concrete function running an optimized GraphDef between the tensors of a frozen function
+def import_function(graph_def, frozen):
+	wrapped = tf.compat.v1.wrap_function(lambda: tf.compat.v1.import_graph_def(graph_def, name=''), [])
+	return wrapped.prune(wrapped.graph.get_tensor_by_name(frozen.inputs[0].name),
+		wrapped.graph.get_tensor_by_name(frozen.outputs[0].name))
+
+# export a generator as a SavedModel of its frozen and optimized forward pass, for images of any size
+def export_saved_model(model, directory):
+	frozen = frozen_function(model)
+	graph_def = optimize_graph(frozen)
+	print('>Optimized the graph from %d to %d nodes' % (len(frozen.graph.as_graph_def().node), len(graph_def.node)))
+	module = tf.Module()
+	module.forward = import_function(graph_def, frozen)
+	module.image_shape = tf.Variable(list(model.input_shape[1:]), trainable=False)
+	@tf.function(input_signature=[tf.TensorSpec((None, None, None, model.input_shape[-1]), tf.float32, name='images')])
+	def serve(images):
+		return {'images': module.forward(images)}
+	tf.saved_model.save(module, directory, signatures={'serving_default': serve})
+	print('>Exported:', directory)
+
+# export a generator as a TFLite model for images of image_shape, quantized after training. Full int8 quantization
+# calibrates on representative, an array of [-1,1] images
+def export_tflite(model, filename, quantize='none', image_shape=None, representative=None):
+	frozen = frozen_function(model, image_shape or model.input_shape[1:])
+	converter = tf.lite.TFLiteConverter.from_concrete_functions([frozen])
+	if quantize != 'none':
+		converter.optimizations = [tf.lite.Optimize.DEFAULT]
+	if quantize == 'float16':
+		converter.target_spec.supported_types = [tf.float16]
+	elif quantize == 'int8':
+		if representative is None:
+			raise ValueError('int8 quantization needs representative images')
+		converter.representative_dataset = lambda: ([X[None]] for X in representative)
+	elif quantize not in ('none', 'dynamic'):
+		raise ValueError('Unknown quantization: %s' % quantize)
+	flatbuffer = converter.convert()
+	with open(filename, 'wb') as f:
+		f.write(flatbuffer)
+	print('>Exported: %s (%.1f MB)' % (filename, len(flatbuffer) / (1024.0 * 1024.0)))
+
+# time per image in ms of a translation function on a batch of images, after a first call that traces or allocates
+def time_translation(translate, X):
+	asarray(translate(X[:1]))
+	start = time.perf_counter()
+	asarray(translate(X))
+	return 1000.0 * (time.perf_counter() - start) / len(X)
+
+# compare the translations of an exported artifact with those of the Keras model on a batch of [-1,1] images
+def check_parity(reference, translate, X):
+	difference = absolute(asarray(translate(X)) - asarray(reference(X)))
+	return {'max_diff': float(difference.max()), 'mean_diff': float(difference.mean())}
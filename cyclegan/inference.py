@@ -0,0 +1,176 @@
+# Translating images with a trained generator
+'''
+The pieces of batch translation used by infer.py: decoding images in worker processes, collecting them into batches
+within a latency budget, running a loaded generator on each batch, optionally as tiles of a full resolution image, and
+writing the results on a pool of threads. The generators are loaded by serving.py, this module only needs NumPy and
+Pillow, so serving an exported TFLite generator never imports TensorFlow.
+'''
+import sys
+import time
+from os import listdir
+from os import makedirs
+from os.path import basename
+from os.path import join
+from os.path import splitext
+from collections import deque
+from queue import Empty
+from queue import Queue
+from threading import BoundedSemaphore
+from threading import Thread
+from concurrent.futures import ThreadPoolExecutor
+from numpy import arange
+from numpy import asarray
+from numpy import clip
+from numpy import minimum
+from numpy import outer
+from numpy import pad as pad_array
+from numpy import zeros
+from numpy import percentile
+from numpy import stack
+from numpy import uint8
+from PIL import Image
+from .data import decode_image
+
+# enumerate the images to translate, from a directory or one filename per line of stdin
+def list_inputs(path):
+	if path == '-':
+		return (line.strip() for line in sys.stdin if line.strip())
+	return (join(path, filename) for filename in sorted(listdir(path)))
+
+# submit images to the decode pool as long as fewer than max_pending are in flight
+def read_images(filenames, pool, size, decoded, pending, max_pending):
+	for filename in filenames:
+		pending.acquire()
+		start = time.time()
+		pool.apply_async(decode_image, (filename, size), callback=lambda result, start=start: decoded.put((start,) + result))
+	# wait until every image has been taken by the batcher, then mark the end of the stream
+	for _ in range(max_pending):
+		pending.acquire()
+	decoded.put(None)
+
+# collect the next batch, returns None at the end of the stream
+def next_batch(decoded, pending, batch_size, max_latency):
+	batch = list()
+	while len(batch) < batch_size:
+		try:
+			# wait for the first image, then only until the oldest image reaches the latency budget
+			timeout = None if not batch else max(0.0, batch[0][0] + max_latency - time.time())
+			item = decoded.get(timeout=timeout)
+		except Empty:
+			break
+		if item is None:
+			# put the end marker back for the next call
+			decoded.put(None)
+			break
+		pending.release()
+		start, filename, pixels, error = item
+		if error is not None:
+			print('>Skipped %s: %s' % (filename, error))
+			continue
+		batch.append(item)
+	if not batch and item is None:
+		return None
+	return batch
+
+'''
+The generator and the PatchGAN discriminator are fully convolutional, so the generator can translate images larger than
+the 256x256 images it was trained on. Running a multi-megapixel photo as one tensor would need the activations of the
+nine 256-filter resnet blocks for the whole photo at once, so translate_tiled() cuts the image into overlapping square
+tiles instead and runs them in batches through the same compiled graph, whatever the size of the photo.
+
+Each translated tile is weighted by a window that ramps down over the overlap towards the tile borders, and the weighted
+tiles are summed and divided by the summed weights. This blends the seams where neighbouring tiles, each normalized with
+its own instance statistics, disagree. Memory is bounded by one batch of tiles plus the float32 output image. Images
+smaller than a tile are padded by reflection and cropped afterwards.
+'''
+
+# offsets of the tiles along one axis, the last tile is aligned with the end of the axis
+def tile_offsets(length, tile, stride):
+	offsets = list(range(0, length - tile, stride))
+	offsets.append(length - tile)
+	return offsets
+
+# blending window of a square tile, ramping from the border over the overlap
+def tile_window(tile, overlap):
+	ramp = clip(minimum(arange(tile) + 1, tile - arange(tile)) / (overlap + 1.0), 0, 1)
+	return outer(ramp, ramp)[:, :, None].astype('float32')
+
+# translate an image of any size as overlapping tiles, returns the translated image in [-1,1]
+def translate_tiled(translate, pixels, tile=256, overlap=32, batch_size=8):
+	height, width = pixels.shape[:2]
+	# pad images smaller than a tile
+	pad = ((0, max(0, tile - height)), (0, max(0, tile - width)), (0, 0))
+	pixels = pad_array(pixels, pad, mode='reflect')
+	stride = tile - overlap
+	corners = [(y, x) for y in tile_offsets(pixels.shape[0], tile, stride) for x in tile_offsets(pixels.shape[1], tile, stride)]
+	window = tile_window(tile, overlap)
+	out = zeros(pixels.shape, dtype='float32')
+	weights = zeros(pixels.shape[:2] + (1,), dtype='float32')
+	tiles = zeros((min(batch_size, len(corners)), tile, tile, pixels.shape[2]), dtype='float32')
+	for i in range(0, len(corners), batch_size):
+		batch = corners[i:i + batch_size]
+		# cut and scale the tiles from [0,255] to [-1,1]
+		for j, (y, x) in enumerate(batch):
+			tiles[j] = pixels[y:y + tile, x:x + tile]
+		X = (tiles[:len(batch)] - 127.5) / 127.5
+		Y = asarray(translate(X))
+		# accumulate the weighted tiles
+		for j, (y, x) in enumerate(batch):
+			out[y:y + tile, x:x + tile] += Y[j] * window
+			weights[y:y + tile, x:x + tile] += window
+	out /= weights
+	return out[:height, :width]
+
+# scale a translated image to [0,255] and save it, returns the latency of the image
+def write_image(filename, pixels, start):
+	pixels = clip((pixels + 1) * 127.5, 0, 255).astype(uint8)
+	Image.fromarray(pixels).save(filename)
+	return time.time() - start
+
+# translate a stream of images decoded by the pool, returns the latencies of the written images
+def translate_images(translate, filenames, output, pool, size=(256,256), batch_size=8, max_latency=0.05, n_writers=2,
+		tile=None, overlap=32):
+	makedirs(output, exist_ok=True)
+	# tiled images keep their size and are translated one at a time, their tiles are batched instead
+	tile_batch_size = batch_size
+	if tile is not None:
+		size, batch_size = None, 1
+	decoded = Queue()
+	# bound the number of images being decoded or waiting for a batch, and the number waiting to be written
+	max_pending = 4 * batch_size
+	pending = BoundedSemaphore(max_pending)
+	writing = deque()
+	latencies = list()
+	with ThreadPoolExecutor(n_writers) as writers:
+		reader = Thread(target=read_images, args=(filenames, pool, size, decoded, pending, max_pending), daemon=True)
+		reader.start()
+		while True:
+			batch = next_batch(decoded, pending, batch_size, max_latency)
+			if batch is None:
+				break
+			if not batch:
+				continue
+			if tile is not None:
+				Y = [translate_tiled(translate, pixels, tile, overlap, tile_batch_size) for _, _, pixels, _ in batch]
+			else:
+				# scale from [0,255] to [-1,1] and translate the batch
+				X = (stack([pixels for _, _, pixels, _ in batch]).astype('float32') - 127.5) / 127.5
+				Y = asarray(translate(X))
+			# write the results in the background
+			for (start, filename, _, _), pixels in zip(batch, Y):
+				target = join(output, splitext(basename(filename))[0] + '.png')
+				writing.append(writers.submit(write_image, target, pixels, start))
+			while len(writing) > max_pending:
+				latencies.append(writing.popleft().result())
+		reader.join()
+		latencies.extend(future.result() for future in writing)
+	return latencies
+
+# print latency percentiles and throughput
+def report(latencies, elapsed):
+	if not latencies:
+		print('>No images translated')
+		return
+	p50, p90, p99 = percentile(latencies, [50, 90, 99]) * 1000
+	print('>Translated %d images in %.1fs (%.1f images/sec), latency p50 %.1fms p90 %.1fms p99 %.1fms'
+		% (len(latencies), elapsed, len(latencies) / elapsed, p50, p90, p99))
@@ -0,0 +1,389 @@
+# Defining the CycleGAN generators and discriminators
+'''
+The generator and discriminator architectures, the composite models that train the generators through the
+discriminators, and the choice of distribution strategy and precision they are built under. Importing this module
+imports TensorFlow.
+'''
+from keras.optimizers import Adam
+from keras.initializers import RandomNormal
+from keras.models import Model
+from keras.models import Input
+from keras.layers import Conv2D
+from keras.layers import Conv2DTranspose
+from keras.layers import LeakyReLU
+from keras.layers import Activation
+from keras.layers import Concatenate
+from keras.layers import Layer
+from keras import initializers
+from keras import regularizers
+from keras import constraints
+import tensorflow as tf
+from .config import get_config
+
+'''
+The models are built and trained under a tf.distribute strategy, chosen with get_strategy():
+	'default'       the default strategy, a single device
+	'mirrored'      MirroredStrategy, one replica per local GPU, or per CPU device when there is no GPU
+	'multi_worker'  MultiWorkerMirroredStrategy, configured from the TF_CONFIG environment variable
+	'tpu'           TPUStrategy
+	'auto'          a TPU when one can be found, otherwise 'mirrored' if there is more than one local device and
+	                'default' if not
+
+The CPU can be split into n_cpu_devices logical devices, which makes data parallelism testable on a single machine.
+This has to happen before TensorFlow initializes its devices, so get_strategy() should be called first.
+'''
+
+# create the distribution strategy used to build and train the models
+def get_strategy(name='auto', n_cpu_devices=1):
+	if n_cpu_devices > 1:
+		# split the CPU into logical devices
+		cpu = tf.config.list_physical_devices('CPU')[0]
+		tf.config.set_logical_device_configuration(cpu, [tf.config.LogicalDeviceConfiguration()] * n_cpu_devices)
+	if name in ('auto', 'tpu'):
+		# detect and init the TPU
+		try:
+			tpu = tf.distribute.cluster_resolver.TPUClusterResolver()
+			tf.config.experimental_connect_to_cluster(tpu)
+			tf.tpu.experimental.initialize_tpu_system(tpu)
+			return tf.distribute.experimental.TPUStrategy(tpu)
+		except (ValueError, tf.errors.NotFoundError):
+			if name == 'tpu':
+				raise
+	if name == 'multi_worker':
+		return tf.distribute.experimental.MultiWorkerMirroredStrategy()
+	# replicate over the GPUs, or over the logical CPU devices without a GPU
+	devices = tf.config.list_logical_devices('GPU') or tf.config.list_logical_devices('CPU')
+	if name == 'mirrored' or (name == 'auto' and len(devices) > 1):
+		return tf.distribute.MirroredStrategy([device.name for device in devices])
+	if name in ('auto', 'default'):
+		return tf.distribute.get_strategy()
+	raise ValueError('Unknown strategy: %s' % name)
+
+
+
+'''
+By default all models compute in float32. set_precision() switches the Keras dtype policy before the models are defined:
+	'float32'         the default
+	'mixed_bfloat16'  convolutions in bfloat16, for CPUs and TPUs with bfloat16 support
+	'mixed_float16'   convolutions in float16, for GPUs, with dynamic loss scaling against gradient underflow
+
+The variables stay in float32 in every mode. The numerically sensitive parts are always computed in float32: every
+InstanceNormalization layer, so the mean and variance of each feature map are not computed in 16 bits, the tanh output
+of the generators, the patch output of the discriminators and therefore every loss. The compiled models wrap their
+optimizer for loss scaling themselves under 'mixed_float16', and define_train_step() does the same.
+'''
+
+# set the precision of the models defined from now on
+def set_precision(precision='float32'):
+	if precision not in ('float32', 'mixed_bfloat16', 'mixed_float16'):
+		raise ValueError('Unknown precision: %s' % precision)
+	tf.keras.mixed_precision.set_global_policy(precision)
+
+'''
+Every convolution of the models except the first and last of the discriminator is followed by instance normalization:
+each feature map of each image is standardized by its own mean and standard deviation, then scaled and shifted by a
+learned gamma and beta per feature map. The layer below replaces the one of keras-contrib, which had to be installed
+from git on every run.
+
+It is weight compatible with the keras-contrib layer. It has the same name, configuration, epsilon and gamma and beta
+weights created in the same order, so models saved with the old layer load with custom_objects={'InstanceNormalization':
+InstanceNormalization}, and it computes the same (x - mean) / (std + epsilon) * gamma + beta. Only the computation is
+rearranged: the mean and variance come from a single tf.nn.moments, and the normalization and the affine transform are
+folded into one scale and one offset per feature map, so the full-size activation is touched by a single multiply-add
+instead of a subtraction, a division, a multiplication and an addition. The ReLU or LeakyReLU that follows the
+normalization in most places can be fused into the layer with activation='relu' or activation='leaky_relu', which saves
+another layer and its full-size intermediate tensor. Activations have no weights, so the weights of a model are the same
+whether or not the activation is fused.
+'''
+
+# instance normalization with an optional fused ReLU or LeakyReLU
+class InstanceNormalization(Layer):
+
+	def __init__(self, axis=None, epsilon=1e-3, center=True, scale=True, activation=None, alpha=0.2,
+			beta_initializer='zeros', gamma_initializer='ones', beta_regularizer=None, gamma_regularizer=None,
+			beta_constraint=None, gamma_constraint=None, **kwargs):
+		super().__init__(**kwargs)
+		if activation not in (None, 'relu', 'leaky_relu'):
+			raise ValueError('Unknown activation: %s' % activation)
+		self.supports_masking = True
+		self.axis = axis
+		self.epsilon = epsilon
+		self.center = center
+		self.scale = scale
+		self.activation = activation
+		self.alpha = alpha
+		self.beta_initializer = initializers.get(beta_initializer)
+		self.gamma_initializer = initializers.get(gamma_initializer)
+		self.beta_regularizer = regularizers.get(beta_regularizer)
+		self.gamma_regularizer = regularizers.get(gamma_regularizer)
+		self.beta_constraint = constraints.get(beta_constraint)
+		self.gamma_constraint = constraints.get(gamma_constraint)
+
+	def build(self, input_shape):
+		# one weight per feature map, or a single one when the whole image is normalized (axis=None)
+		shape = (1,) if self.axis is None else (input_shape[self.axis],)
+		# gamma before beta, as in keras-contrib, so the weight lists line up
+		self.gamma = None
+		if self.scale:
+			self.gamma = self.add_weight(shape=shape, name='gamma', initializer=self.gamma_initializer,
+				regularizer=self.gamma_regularizer, constraint=self.gamma_constraint)
+		self.beta = None
+		if self.center:
+			self.beta = self.add_weight(shape=shape, name='beta', initializer=self.beta_initializer,
+				regularizer=self.beta_regularizer, constraint=self.beta_constraint)
+		super().build(input_shape)
+
+	def call(self, inputs):
+		ndim = len(inputs.shape)
+		# statistics over the spatial axes of each image, and over the channels too when axis is None
+		axis = None if self.axis is None else self.axis % ndim
+		reduction_axes = [i for i in range(1, ndim) if i != axis]
+		mean, variance = tf.nn.moments(inputs, reduction_axes, keepdims=True)
+		# fold the normalization and gamma and beta into one scale and offset per feature map
+		broadcast_shape = [1] * ndim
+		if axis is not None:
+			broadcast_shape[axis] = inputs.shape[axis]
+		scale = 1.0 / (tf.sqrt(variance) + self.epsilon)
+		if self.gamma is not None:
+			scale = scale * tf.reshape(tf.cast(self.gamma, inputs.dtype), broadcast_shape)
+		offset = -mean * scale
+		if self.beta is not None:
+			offset = offset + tf.reshape(tf.cast(self.beta, inputs.dtype), broadcast_shape)
+		outputs = inputs * scale + offset
+		if self.activation == 'relu':
+			return tf.nn.relu(outputs)
+		if self.activation == 'leaky_relu':
+			return tf.nn.leaky_relu(outputs, alpha=self.alpha)
+		return outputs
+
+	def compute_output_shape(self, input_shape):
+		return input_shape
+
+	def get_config(self):
+		config = {
+			'axis': self.axis,
+			'epsilon': self.epsilon,
+			'center': self.center,
+			'scale': self.scale,
+			'activation': self.activation,
+			'alpha': self.alpha,
+			'beta_initializer': initializers.serialize(self.beta_initializer),
+			'gamma_initializer': initializers.serialize(self.gamma_initializer),
+			'beta_regularizer': regularizers.serialize(self.beta_regularizer),
+			'gamma_regularizer': regularizers.serialize(self.gamma_regularizer),
+			'beta_constraint': constraints.serialize(self.beta_constraint),
+			'gamma_constraint': constraints.serialize(self.gamma_constraint)}
+		config.update(super().get_config())
+		return config
+
+'''
+The discriminator is deep CNN that performs image classification. Two disciminator models are used, one
+for Domain-A and one for Domain-B. 
+The disciminator design is based on the effective receptive field of the
+model, which definew the relationship between on output of the model to the number of pixels in the input image.
+This is called a PatchGAN model and is carefully designed so that each output prediction of the model maps to a 70*70
+square or patch of the input image. The benefit of this approach is that the same model can be applied to input images
+of different size, ex larger or smaller than 256*256 pixels.
+
+The output of the model depends on the size of the input image but may be one value or a square acivation map of values.
+Each value is a probability for the likelihood that a patch in the input image is real. These values can be averaged to 
+give an overlall likelihood or classification score if needed.
+
+A pattern of convolutional-batchNorm-LeakyReLU layers is used in the model, which is common to deep convolutional 
+discriminator models. Unilike other models, the CycleGan discriminator uses InstanceNormalization instead of BatchNormalization.
+It is a very simple type of normalization and involves standardizing(eg Scaling to a standard Gaussian) the values on
+each output feature map, rather than across features in a batch.
+
+The width of the first layer and the number of downsampling layers are parameters. The defaults build the C64-C128-C256-
+C512 model above, fewer layers give a smaller receptive field and a larger patch output, see patch_size() in config.py.
+'''
+# define the discriminator model, n_filters wide with n_layers downsampling convolutions
+def define_discriminator(image_shape, n_filters=64, n_layers=4, lr=0.0002, beta_1=0.5):
+	# weight initialization
+	init = RandomNormal(stddev=0.02)
+	# source image input
+	in_image = Input(shape=image_shape)
+	# C64
+	d = Conv2D(n_filters, (4,4), strides=(2,2), padding='same', kernel_initializer=init)(in_image)
+	d = LeakyReLU(alpha=0.2)(d)
+	# C128, C256, C512, doubling the filters up to 8x
+	for i in range(1, n_layers):
+		d = Conv2D(n_filters * min(2**i, 8), (4,4), strides=(2,2), padding='same', kernel_initializer=init)(d)
+		# axis argument is set to -1 to ensure that features are normalized per feature map.
+		d = InstanceNormalization(axis=-1, activation='leaky_relu', alpha=0.2, dtype='float32')(d)
+	# second last output layer
+	d = Conv2D(n_filters * min(2**(n_layers - 1), 8), (4,4), padding='same', kernel_initializer=init)(d)
+	d = InstanceNormalization(axis=-1, activation='leaky_relu', alpha=0.2, dtype='float32')(d)
+	# patch output
+	patch_out = Conv2D(1, (4,4), padding='same', kernel_initializer=init, dtype='float32')(d)
+	# define model
+	model = Model(in_image, patch_out)
+	# compile model
+	model.compile(loss='mse', optimizer=Adam(lr=lr, beta_1=beta_1), loss_weights=[0.5])
+	return model
+
+'''
+The generator is an encoder-decoder model architecute. The model takes a source image and generates a target image.
+It does it by first downsampling or encoding the input image down to a bottleneck layer, then interpreting the encoding 
+with a number of ResNet layers that use skit connections, followed by a series of layers that upsample or decode the 
+representation to the size of the output image.
+
+First we need a function to define the ResNet blocks. These are blocks comprised of two 3x3 CNN layers where the input to
+the block is concatenated to the output of the block, cannel-wise.
+
+Following fuction creates two convolution-InstanceNorm blocks with 3x3 filters and 1x1 stride and without a Relu Activation
+after the second block.
+'''
+
+# generator a resnet block
+def resnet_block(n_filters, input_layer):
+	# weight initialization
+	init = RandomNormal(stddev=0.02)
+	# first layer convolutional layer
+	g = Conv2D(n_filters, (3,3), padding='same', kernel_initializer=init)(input_layer)
+	g = InstanceNormalization(axis=-1, activation='relu', dtype='float32')(g)
+	# second convolutional layer
+	g = Conv2D(n_filters, (3,3), padding='same', kernel_initializer=init)(g)
+	g = InstanceNormalization(axis=-1, dtype='float32')(g)
+	# concatenate merge channel-wise with input layer
+	g = Concatenate()([g, input_layer])
+	return g
+
+'''
+Now, we can define a fuction that will create the 9-resent block version for 256x256 input images. 
+
+The model outputs pixel values with the shape as the input and pixel values are in the rang[-1,1], typlica for GAN
+generator models.
+
+The number of resnet blocks and the width of the first layer are parameters, chosen by the config, see config.py. The
+defaults build the 9-block generator with 64 filters described here, the paper uses 6 blocks for 128x128 images.
+'''
+
+# define the standalone generator model
+def define_generator(image_shape, n_resnet=9, n_filters=64):
+	# weight initialization
+	init = RandomNormal(stddev=0.02)
+	# image input
+	in_image = Input(shape=image_shape)
+	# c7s1-64
+	g = Conv2D(n_filters, (7,7), padding='same', kernel_initializer=init)(in_image)
+	g = InstanceNormalization(axis=-1, activation='relu', dtype='float32')(g)
+	# d128
+	g = Conv2D(2 * n_filters, (3,3), strides=(2,2), padding='same', kernel_initializer=init)(g)
+	g = InstanceNormalization(axis=-1, activation='relu', dtype='float32')(g)
+	# d256
+	g = Conv2D(4 * n_filters, (3,3), strides=(2,2), padding='same', kernel_initializer=init)(g)
+	g = InstanceNormalization(axis=-1, activation='relu', dtype='float32')(g)
+	# R256
+	for _ in range(n_resnet):
+		g = resnet_block(4 * n_filters, g)
+	# u128
+	g = Conv2DTranspose(2 * n_filters, (3,3), strides=(2,2), padding='same', kernel_initializer=init)(g)
+	g = InstanceNormalization(axis=-1, activation='relu', dtype='float32')(g)
+	# u64
+	g = Conv2DTranspose(n_filters, (3,3), strides=(2,2), padding='same', kernel_initializer=init)(g)
+	g = InstanceNormalization(axis=-1, activation='relu', dtype='float32')(g)
+	# c7s1-3
+	g = Conv2D(3, (7,7), padding='same', kernel_initializer=init)(g)
+	g = InstanceNormalization(axis=-1, dtype='float32')(g)
+	out_image = Activation('tanh', dtype='float32')(g)
+	# define model
+	model = Model(in_image, out_image)
+	return model
+
+'''
+The disciminator models are trained directly on real and generated images, whereas the genrator models are not.
+
+Instread, the genrator models are trained via their related discriminator models. Specifically, they are updated to 
+minimize the loss predicted by the discriminator for generated images marked as 'real', called adverssarial loss. As such
+they are encouraged to generate images that better fit into the target domain.
+
+The genrator models are alos updated based on how effective they are at the regeneration of a source image when used with
+the other generator model, called cycle loss. Finally, a generator model is expected to output an imgage without translation
+when provided an example from the target domain, called identity loss.
+
+Altogether, each generator model is optimized via the combination of four outputs with four loss fuctions:
+	Adversarial loss(L2 or mean squared error)
+	Identity loss(L1 or mean absolute error)
+	Forward cycle loss(L1 or mean absolute error)
+	Backward cycle loss(L1 or mean absolute error)
+
+This can be achieved by defining a composite model used to train each generator model that is responsible for only
+updating the weights of that generator model, although it is requited to share the weights with the related disciminator
+model and the other generator model.
+
+This is implemented int the define_composite_model() fuction below that takes a defined generator model(g_model_1) as 
+well as the defined discriminator model for the generator models output(d_model) and the other generator model(g_model_2).
+The weights of the other models are marked as not trainable as we are only interested in updating the first generator model,
+i.e the focus of this comosite mode.
+
+The disciminator is connected to the output of the genrator in order to classify generated images as real or fake. A Second
+input of the composite model is defined as an image from the target domain (instead of the source domain), which the 
+generator is expected to output without translation for the identity mapping. Next, forward cycle loss involves connecting the 
+output of the generator to the other generator, which will reconstruct the source image. Finally, the backward cycle loss
+involves the image from the target domain used for the identity mapping that is also passed through the other generaor 
+whose output is connected to out main generator as input and outputs a reconstructed version of that image from the target domain.
+
+Summery: a composite model has two inputs for the real photos from Domain-A and Domain-B, and four outputs for the discriminator
+output, identity generated image, forward cycle generated image, and bakward cycle generated image.
+
+Only the weights of the first or main generator model are updated for the composite model and this is done via the weighted sum
+of all loss functions. The cycle loss is given more weight (10-times) than the adversarial loss, and the identity loss
+is always used with a weighting half of the cycle loss(5-times).
+'''
+
+# define a composite model for updating generators by adversarial and cycle loss
+def define_composite_model(g_model_1, d_model, g_model_2, image_shape, lr=0.0002, beta_1=0.5):
+	# ensure the model we're updating is trainable
+	g_model_1.trainable = True
+	# mark discriminator as not trainable
+	d_model.trainable = False
+	# mark other generator model as not trainable
+	g_model_2.trainable = False
+	# discriminator element
+	input_gen = Input(shape=image_shape)
+	gen1_out = g_model_1(input_gen)
+	output_d = d_model(gen1_out)
+	# identity element
+	input_id = Input(shape=image_shape)
+	output_id = g_model_1(input_id)
+	# forward cycle
+	output_f = g_model_2(gen1_out)
+	# backward cycle
+	gen2_out = g_model_2(input_id)
+	output_b = g_model_1(gen2_out)
+	# define model graph
+	model = Model([input_gen, input_id], [output_d, output_id, output_f, output_b])
+	# define optimization algorithm configuration
+	opt = Adam(lr=lr, beta_1=beta_1)
+	# compile model with weighting of least squares loss and L1 loss
+	model.compile(loss=['mse', 'mae', 'mae', 'mae'], loss_weights=[1, 5, 10, 10], optimizer=opt)
+	return model
+
+'''
+We need to create a composite mode for each generator mode, e.g. the Generator-A for zebra to house translation, and the
+Generator-B for horse to zebra translation.
+'''
+
+# define the two generators, two discriminators and two composite models under the distribution strategy, sized by a
+# config from get_config()
+def define_models(image_shape, strategy=None, config=None):
+	strategy = strategy or tf.distribute.get_strategy()
+	config = config or get_config()
+	generator = dict(n_resnet=config['n_resnet'], n_filters=config['g_filters'])
+	discriminator = dict(n_filters=config['d_filters'], n_layers=config['d_layers'], lr=config['lr'], beta_1=config['beta_1'])
+	optimizer = dict(lr=config['lr'], beta_1=config['beta_1'])
+	with strategy.scope():
+		# generator: A -> B
+		g_model_AtoB = define_generator(image_shape, **generator)
+		# generator: B -> A
+		g_model_BtoA = define_generator(image_shape, **generator)
+		# discriminator: A -> [real/fake]
+		d_model_A = define_discriminator(image_shape, **discriminator)
+		# discriminator: B -> [real/fake]
+		d_model_B = define_discriminator(image_shape, **discriminator)
+		# composite: A -> B -> [real/fake, A]
+		c_model_AtoB = define_composite_model(g_model_AtoB, d_model_B, g_model_BtoA, image_shape, **optimizer)
+		# composite: B -> A -> [real/fake, B]
+		c_model_BtoA = define_composite_model(g_model_BtoA, d_model_A, g_model_AtoB, image_shape, **optimizer)
+	return d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB, c_model_BtoA
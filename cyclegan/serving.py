@@ -0,0 +1,129 @@
+# Loading generators for translation
+'''
+A generator is served from one of three kinds of files, and load_translator() picks the loader from the filename:
+	.h5         the Keras model written by save_models(), rebuilt with the InstanceNormalization layer registered
+	directory   a SavedModel written by export.py, a frozen and optimized graph that loads without Keras or any of
+	            the layers of this project
+	.tflite     a TFLite flatbuffer written by export.py, optionally quantized, run by the LiteRT interpreter
+
+Every loader returns the input shape the generator was built for and a function translating a batch of [-1,1] float32
+images, whose result can be turned into a NumPy array with asarray(). Each loader imports only what its format needs,
+so a TFLite generator starts without importing TensorFlow when the ai_edge_litert or tflite_runtime package is
+installed, and a SavedModel without building a Keras model.
+
+The Keras generator is loaded once without its training configuration. Its forward pass is wrapped in a tf.function
+with a batch dimension of any size, so the dynamic batches of different sizes do not cause retracing.
+
+For faster CPU inference the Keras generator can be rebuilt in float16 or bfloat16. The convolutions then run in the
+reduced precision while the instance normalization statistics and the tanh output stay in float32. Only the computation
+is affected, the weights are copied from the float32 model.
+'''
+from os.path import isdir
+from numpy import asarray
+
+# rebuild a model with its layers computing in the given precision, numerically sensitive layers stay in float32
+def cast_model(model, precision):
+	if precision == 'float32':
+		return model
+	import tensorflow as tf
+	from .models import InstanceNormalization
+	policy = tf.keras.mixed_precision.Policy('mixed_' + precision)
+	output_layer = model.layers[-1]
+	def clone_layer(layer):
+		config = layer.get_config()
+		keep = isinstance(layer, InstanceNormalization) or layer is output_layer
+		config['dtype'] = 'float32' if keep else policy
+		return layer.__class__.from_config(config)
+	cast = tf.keras.models.clone_model(model, clone_function=clone_layer)
+	cast.set_weights(model.get_weights())
+	return cast
+
+# rebuild a model for inputs of another size, the generator is fully convolutional so the weights are unchanged
+def resize_model(model, image_shape):
+	if tuple(model.input_shape[1:]) == tuple(image_shape):
+		return model
+	import tensorflow as tf
+	from keras.models import Input
+	resized = tf.keras.models.clone_model(model, input_tensors=Input(shape=image_shape))
+	resized.set_weights(model.get_weights())
+	return resized
+
+# load a saved generator and return a function translating a batch of [-1,1] images, optionally of square tiles
+def load_generator(filename, precision='float32', tile=None):
+	import tensorflow as tf
+	from keras.models import load_model
+	from .models import InstanceNormalization
+	model = load_model(filename, custom_objects={'InstanceNormalization': InstanceNormalization}, compile=False)
+	model = cast_model(model, precision)
+	if tile is not None:
+		model = resize_model(model, (tile, tile, model.input_shape[-1]))
+	image_shape = model.input_shape[1:]
+	@tf.function(input_signature=[tf.TensorSpec((None,) + tuple(image_shape), tf.float32)])
+	def translate(X):
+		return tf.cast(model(X, training=False), tf.float32)
+	return model, translate
+
+# load a SavedModel written by export_saved_model(), returns the input shape it was trained on and the translation
+def load_saved_model(directory):
+	import tensorflow as tf
+	module = tf.saved_model.load(directory)
+	serve = module.signatures['serving_default']
+	image_shape = tuple(int(d) for d in module.image_shape.numpy())
+	def translate(X):
+		return serve(images=tf.constant(X, dtype=tf.float32))['images']
+	return image_shape, translate
+
+# the TFLite interpreter class, from the first of LiteRT, tflite_runtime and TensorFlow that is installed
+def tflite_interpreter():
+	try:
+		from ai_edge_litert.interpreter import Interpreter
+	except ImportError:
+		try:
+			from tflite_runtime.interpreter import Interpreter
+		except ImportError:
+			import tensorflow as tf
+			Interpreter = tf.lite.Interpreter
+	return Interpreter
+
+# load a TFLite generator written by export_tflite(), returns its input shape and the translation
+def load_tflite(filename, n_threads=None):
+	interpreter = tflite_interpreter()(model_path=filename, num_threads=n_threads)
+	input_details = interpreter.get_input_details()[0]
+	output_index = interpreter.get_output_details()[0]['index']
+	image_shape = tuple(int(d) for d in input_details['shape'][1:])
+	interpreter.allocate_tensors()
+	# the batch size the tensors are allocated for
+	allocated = [int(input_details['shape'][0])]
+	def translate(X):
+		X = asarray(X, dtype='float32')
+		if X.shape[1:] != image_shape:
+			raise ValueError('The TFLite generator takes %s images, not %s' % (image_shape, X.shape[1:]))
+		# reallocate only when the batch size changes
+		if len(X) != allocated[0]:
+			interpreter.resize_tensor_input(input_details['index'], X.shape)
+			interpreter.allocate_tensors()
+			allocated[0] = len(X)
+		interpreter.set_tensor(input_details['index'], X)
+		interpreter.invoke()
+		return interpreter.get_tensor(output_index)
+	return image_shape, translate
+
+# load a generator from an .h5 file, a SavedModel directory or a .tflite file, returns the shape of the images it
+# translates and the translation. Only a Keras generator can be cast to another precision
+def load_translator(filename, precision='float32', tile=None):
+	if not filename.endswith('.tflite') and not isdir(filename):
+		model, translate = load_generator(filename, precision, tile)
+		return tuple(model.input_shape[1:]), translate
+	if precision != 'float32':
+		raise ValueError('Only an .h5 generator can be cast to %s' % precision)
+	if filename.endswith('.tflite'):
+		image_shape, translate = load_tflite(filename)
+		# the sizes of a TFLite graph are fixed when it is exported
+		if tile is not None and tile != image_shape[0]:
+			raise ValueError('%s was exported for %dx%d tiles' % (filename, image_shape[0], image_shape[1]))
+		return image_shape, translate
+	image_shape, translate = load_saved_model(filename)
+	# the SavedModel takes images of any size
+	if tile is not None:
+		image_shape = (tile, tile, image_shape[-1])
+	return image_shape, translate
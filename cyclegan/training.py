@@ -0,0 +1,711 @@
+# Training the CycleGAN
+'''
+The training loop with its checkpoints, sample plots and metrics, and the fused training step that updates all four
+models in one graph execution. Importing this module imports TensorFlow, matplotlib is only imported by the background
+thread that draws the first plot.
+'''
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from csv import DictWriter
+from os import listdir
+from os import makedirs
+from os import remove
+from os import replace
+from os.path import exists
+from os.path import isdir
+from os.path import join
+from queue import Queue
+from threading import Thread
+from numpy import load
+from numpy import savez
+from numpy import zeros
+from numpy import asarray
+from keras.optimizers import Adam
+from keras.models import clone_model
+import tensorflow as tf
+from .data import BatchProvider
+from .data import ImagePool
+from .data import generate_real_samples
+from .data import center_crop
+from .data import update_image_pool
+from .config import get_config
+from .config import learning_rate
+from .config import patch_size
+
+'''
+Similarly, a sample of generated images is required to update each discriminator model in each training iteration.
+
+The generate_fake_samples() function below generates this sample given a generator model and the sample of real images 
+from the source domain. Again, target values for each generated image are provided with the correct shape of the PatchGAN,
+indicating that they are fake or generted (target=0.0)
+'''
+
+# generate a batch of images, returns images and targets
+def generate_fake_samples(g_model, dataset, patch_shape):
+	# generate fake instance
+	X = g_model.predict(dataset)
+	# create 'fake' class labels (0)
+	y = zeros((len(X), patch_shape, patch_shape, 1))
+	return X, y
+
+'''
+Typically, GAN model do not converge; instead, an equibirium is found between the generator and discriminator models.
+As such, we cannot easily judge whether training should stop. Therefore, we can save the model and use it to generate 
+sample image-to-image translaations periodically during training, such as every one or five training epochs.
+
+We can then review the generated images at the end of training and use the image quality to choose a final model. 
+The save_models() fuction bellow will save each generator model to the current directory in H5 format, including the 
+training iteration number in the filename.
+'''
+
+# save the generator models to file, in the background when a checkpoint writer is given
+def save_models(step, g_model_AtoB, g_model_BtoA, writer=None):
+	# save the first generator model
+	filename1 = 'g_model_AtoB_%06d.h5' % (step+1)
+	# save the second generator model
+	filename2 = 'g_model_BtoA_%06d.h5' % (step+1)
+	if writer is None:
+		g_model_AtoB.save(filename1)
+		g_model_BtoA.save(filename2)
+	else:
+		writer.save_model(g_model_AtoB, filename1)
+		writer.save_model(g_model_BtoA, filename2)
+	print('>Saved: %s and %s' % (filename1, filename2))
+	return filename1, filename2
+
+'''
+The summarize_performance() function below uses a given generator model to generate translated version of a few randomly
+selected source photographs and saaves the plot to file.
+
+The source image are plotted on the first row and the generated images are plotted on the second row. The plot is drawn
+on its own matplotlib Figure rather than through pyplot, so that it can be rendered by the background checkpoint writer.
+'''
+
+# plot source images on the first row and translated images on the second row and save the plot to file
+def plot_performance(filename, X_in, X_out):
+	# imported here, so that only runs which plot pay for it
+	from matplotlib.figure import Figure
+	from matplotlib.backends.backend_agg import FigureCanvasAgg
+	figure = Figure()
+	FigureCanvasAgg(figure)
+	n_samples = len(X_in)
+	for i, X in enumerate(list(X_in) + list(X_out)):
+		axis = figure.add_subplot(2, n_samples, 1 + i)
+		axis.axis('off')
+		axis.imshow(X)
+	figure.savefig(filename)
+
+# generate samples and save as a plot, in the background when a checkpoint writer is given
+def summarize_performance(step, g_model, trainX, name, n_samples=5, writer=None):
+	# select a sample of input images, the center of the images when they are prepared larger than the model input
+	X_in, _ = generate_real_samples(trainX, n_samples, 0)
+	X_in = center_crop(X_in, g_model.input_shape[1])
+	# generate translated images
+	X_out, _ = generate_fake_samples(g_model, X_in, 0)
+	# scale all pixels from [-1,1] to [0,1]
+	X_in = (X_in + 1) / 2.0
+	X_out = (X_out + 1) / 2.0
+	# save plot to file
+	filename1 = '%s_generated_plot_%06d.png' % (name, (step+1))
+	if writer is None:
+		plot_performance(filename1, X_in, X_out)
+	else:
+		writer.submit(plot_performance, filename1, X_in, X_out)
+
+'''
+Saving two generators and rendering two plots on the training thread stalls training for the whole time it takes. The
+CheckpointWriter below does that work on a background thread instead. The training thread only takes a copy of the
+weights in memory with get_weights(), which is quick, and hands the copy over. The generator files are written from
+shadow copies of the generators that only the background thread uses. At most max_pending jobs wait in the queue, so a
+slow disk makes training wait rather than accumulate copies of the weights in memory.
+
+Besides the generators, a complete checkpoint is written every time the models are saved so that training can be resumed.
+It holds the weights of both generators and both discriminators, the state of every optimizer, the contents of both
+image pools and the training step, in a single uncompressed .npz file, checkpoints/ckpt_<step>.npz. Only the last
+keep checkpoints are kept. The file is written under a temporary name and renamed, so an interrupted write never leaves a
+broken latest checkpoint.
+
+The state of an optimizer is saved as its variables, in the order it created them, which is the same on every run.
+Optimizers create their variables on the first update, so before restoring an optimizer they are created first, with
+build() where the Keras version has it and otherwise with a zero update, which leaves Adam's model weights unchanged,
+and then overwritten with the saved values.
+'''
+
+# writes checkpoints, generators and plots on a background thread
+class CheckpointWriter:
+
+	def __init__(self, directory='checkpoints', keep=3, max_pending=2):
+		self.directory = directory
+		self.keep = keep
+		self.shadows = dict()
+		self.error = None
+		makedirs(directory, exist_ok=True)
+		self.queue = Queue(maxsize=max_pending)
+		self.thread = Thread(target=self._run, daemon=True)
+		self.thread.start()
+
+	# run jobs until the writer is closed
+	def _run(self):
+		while True:
+			job = self.queue.get()
+			if job is None:
+				return
+			fn, args = job
+			try:
+				fn(*args)
+			except Exception as e:
+				self.error = e
+
+	# queue a function call for the background thread
+	def submit(self, fn, *args):
+		# report a failure of an earlier job on the training thread
+		if self.error is not None:
+			error, self.error = self.error, None
+			raise error
+		self.queue.put((fn, args))
+
+	# save a copy of the model as it is now to an .h5 file
+	def save_model(self, model, filename):
+		if id(model) not in self.shadows:
+			self.shadows[id(model)] = clone_model(model)
+		self.submit(save_weights_as_model, self.shadows[id(model)], model.get_weights(), filename)
+
+	# save a complete checkpoint of the state given by snapshot_checkpoint()
+	def save_checkpoint(self, step, state):
+		self.submit(write_checkpoint, self.directory, step, state, self.keep)
+
+	# wait for the queued jobs and stop the background thread
+	def close(self):
+		self.queue.put(None)
+		self.thread.join()
+		if self.error is not None:
+			raise self.error
+
+# set the weights of the shadow model and save it
+def save_weights_as_model(model, weights, filename):
+	model.set_weights(weights)
+	model.save(filename)
+
+# copy the training state into a dictionary of arrays
+def snapshot_checkpoint(step, models, optimizers, pools):
+	state = {'step': asarray(step)}
+	for name, model in models.items():
+		for i, weights in enumerate(model.get_weights()):
+			state['weights/%s/%d' % (name, i)] = weights
+	for name, (opt, _) in optimizers.items():
+		for i, variable in enumerate(optimizer_variables(opt)):
+			state['optimizer/%s/%d' % (name, i)] = variable.numpy()
+	for name, pool in pools.items():
+		images = pool.get_state()
+		if images is not None:
+			state['pool/%s' % name] = images
+	return state
+
+# write a checkpoint and delete the oldest ones
+def write_checkpoint(directory, step, state, keep):
+	filename = join(directory, 'ckpt_%06d.npz' % step)
+	with open(filename + '.tmp', 'wb') as f:
+		savez(f, **state)
+	replace(filename + '.tmp', filename)
+	for old in list_checkpoints(directory)[:-keep]:
+		remove(old)
+
+# checkpoints in a directory, oldest first
+def list_checkpoints(directory):
+	if not isdir(directory):
+		return list()
+	return [join(directory, name) for name in sorted(listdir(directory)) if name.startswith('ckpt_') and name.endswith('.npz')]
+
+# the most recent checkpoint in a directory, or None
+def latest_checkpoint(directory):
+	checkpoints = list_checkpoints(directory)
+	return checkpoints[-1] if checkpoints else None
+
+# list the arrays saved under a prefix, in order
+def unpack_arrays(state, prefix):
+	n = len([key for key in state.keys() if key.startswith(prefix + '/')])
+	return [state['%s/%d' % (prefix, i)] for i in range(n)]
+
+# the variables of an optimizer in the order they were created, a method before Keras 2.11 and a property since
+def optimizer_variables(opt):
+	return list(opt.variables() if callable(opt.variables) else opt.variables)
+
+# create the variables of an optimizer for the model variables it updates, leaving the model variables unchanged
+def build_optimizer(opt, variables, strategy):
+	if hasattr(opt, 'build'):
+		if not getattr(opt, 'built', False):
+			with strategy.scope():
+				opt.build(variables)
+		return
+	# older optimizers create their variables on the first update, a zero update leaves Adam's model weights unchanged
+	def zero_update():
+		opt.apply_gradients(zip([tf.zeros_like(v) for v in variables], variables))
+	strategy.run(tf.function(zero_update))
+
+# restore the training state from a checkpoint, returns the step to continue from
+def restore_checkpoint(filename, models, optimizers, pools, strategy=None):
+	strategy = strategy or tf.distribute.get_strategy()
+	state = load(filename)
+	for name, model in models.items():
+		model.set_weights(unpack_arrays(state, 'weights/' + name))
+	for name, (opt, variables) in optimizers.items():
+		weights = unpack_arrays(state, 'optimizer/' + name)
+		if not weights:
+			print('>No state for optimizer %s in %s' % (name, filename))
+			continue
+		# create the optimizer variables, then overwrite them
+		build_optimizer(opt, variables, strategy)
+		opt_variables = optimizer_variables(opt)
+		if [tuple(v.shape) for v in opt_variables] != [w.shape for w in weights]:
+			raise ValueError('The state of optimizer %s in %s does not match its %d variables'
+				% (name, filename, len(opt_variables)))
+		for variable, value in zip(opt_variables, weights):
+			variable.assign(value)
+	for name, pool in pools.items():
+		key = 'pool/%s' % name
+		pool.set_state(state[key] if key in state else None)
+	return int(state['step'])
+
+# set the learning rate of every optimizer
+def set_learning_rate(optimizers, lr):
+	for opt, _ in optimizers.values():
+		opt.learning_rate = lr
+
+# the optimizers of the compiled models with the variables they update
+def compiled_optimizers(d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB, c_model_BtoA):
+	return {
+		'd_model_A': (d_model_A.optimizer, d_model_A.weights),
+		'd_model_B': (d_model_B.optimizer, d_model_B.weights),
+		'c_model_AtoB': (c_model_AtoB.optimizer, g_model_AtoB.weights),
+		'c_model_BtoA': (c_model_BtoA.optimizer, g_model_BtoA.weights)}
+
+'''
+Each iteration of train() below makes two predict() and six train_on_batch() calls, each one a separate dispatch and
+round trip between the host and the device, and the composite models compute the same translations again.
+
+define_train_step() builds an alternative training step as a single tf.function. The real images of both domains are
+translated once and the fakes are reused for the identity, cycle and adversarial terms of both generators, with the same
+loss weights as the composite models [1, 5, 10, 10], and for the discriminator updates with their 0.5 loss weight. The
+image pool decision is made on the host with ImagePool.select() before the step, so the pooled fakes are assembled
+inside the graph, and the new fakes are returned so that they can be pushed into the pool afterwards.
+
+Each model gets its own Adam optimizer with the same settings as the compiled models. Unlike the two train_on_batch()
+calls per discriminator, the real and fake losses of a discriminator are applied as one update, and all four updates
+use the weights from before the step.
+
+Under a distribution strategy the global batch is split evenly between the replicas, each replica runs the step on its
+share and the gradients are summed across replicas, so the number of images per step grows with the number of workers.
+The batch size must therefore be a multiple of the number of replicas.
+'''
+
+# mean squared error, as used for the adversarial loss
+def mse_loss(y_true, y_pred):
+	return tf.reduce_mean(tf.square(y_true - y_pred))
+
+# mean absolute error, as used for the identity and cycle losses
+def mae_loss(y_true, y_pred):
+	return tf.reduce_mean(tf.abs(y_true - y_pred))
+
+# define a compiled step that updates both generators and both discriminators in one graph execution. With n_accum
+# micro-batches per update, the step only accumulates the gradients and train_step.apply() makes the update
+def define_train_step(g_model_AtoB, g_model_BtoA, d_model_A, d_model_B, lr=0.0002, strategy=None, beta_1=0.5,
+		n_accum=1):
+	strategy = strategy or tf.distribute.get_strategy()
+	n_replicas = strategy.num_replicas_in_sync
+	models = [g_model_AtoB, g_model_BtoA, d_model_A, d_model_B]
+	# define optimization algorithm configuration for each model, the optimizer variables are mirrored like the models
+	with strategy.scope():
+		opt_AtoB, opt_BtoA, opt_A, opt_B = [Adam(lr=lr, beta_1=beta_1) for _ in range(4)]
+		# scale the losses so that small float16 gradients do not underflow
+		loss_scaling = tf.keras.mixed_precision.global_policy().name == 'mixed_float16'
+		if loss_scaling:
+			opt_AtoB, opt_BtoA, opt_A, opt_B = [tf.keras.mixed_precision.LossScaleOptimizer(opt)
+				for opt in (opt_AtoB, opt_BtoA, opt_A, opt_B)]
+		# the gradients summed over the micro-batches, kept apart on each replica until the update
+		accumulators = [[tf.Variable(tf.zeros(w.shape, w.dtype), trainable=False,
+			synchronization=tf.VariableSynchronization.ON_READ, aggregation=tf.VariableAggregation.SUM)
+			for w in model.weights] for model in models] if n_accum > 1 else None
+	optimizers = [opt_AtoB, opt_BtoA, opt_A, opt_B]
+	# the fakes of the whole batch, a pooled fake can be the new fake of an image on another replica
+	def gather_batch(X):
+		if n_replicas == 1:
+			return X
+		return tf.distribute.get_replica_context().all_gather(X, axis=0)
+	# the variables are watched directly, the trainable flags are switched off by define_composite_model()
+	def replica_step(X_realA, X_realB, sourceA, historyA, sourceB, historyB):
+		with tf.GradientTape(persistent=True) as tape:
+			# translate real images
+			X_fakeB = g_model_AtoB(X_realA, training=True)
+			X_fakeA = g_model_BtoA(X_realB, training=True)
+			# identity mapping
+			X_idB = g_model_AtoB(X_realB, training=True)
+			X_idA = g_model_BtoA(X_realA, training=True)
+			# forward and backward cycle
+			X_cycleA = g_model_BtoA(X_fakeB, training=True)
+			X_cycleB = g_model_AtoB(X_fakeA, training=True)
+			# adversarial element
+			y_fakeB = d_model_B(X_fakeB, training=True)
+			y_fakeA = d_model_A(X_fakeA, training=True)
+			cycle_loss = 10 * mae_loss(X_realA, X_cycleA) + 10 * mae_loss(X_realB, X_cycleB)
+			g_loss1 = mse_loss(tf.ones_like(y_fakeB), y_fakeB) + 5 * mae_loss(X_realB, X_idB) + cycle_loss
+			g_loss2 = mse_loss(tf.ones_like(y_fakeA), y_fakeA) + 5 * mae_loss(X_realA, X_idA) + cycle_loss
+			# update fakes from pool, the new fake of the batch given by the source or else the pool image
+			newA = tf.gather(gather_batch(tf.stop_gradient(X_fakeA)), tf.maximum(sourceA, 0))
+			newB = tf.gather(gather_batch(tf.stop_gradient(X_fakeB)), tf.maximum(sourceB, 0))
+			X_poolA = tf.where(tf.reshape(sourceA >= 0, [-1, 1, 1, 1]), newA, historyA)
+			X_poolB = tf.where(tf.reshape(sourceB >= 0, [-1, 1, 1, 1]), newB, historyB)
+			# discriminator losses on real and fake images
+			y_realA, y_poolA = d_model_A(X_realA, training=True), d_model_A(X_poolA, training=True)
+			y_realB, y_poolB = d_model_B(X_realB, training=True), d_model_B(X_poolB, training=True)
+			dA_loss1 = 0.5 * mse_loss(tf.ones_like(y_realA), y_realA)
+			dA_loss2 = 0.5 * mse_loss(tf.zeros_like(y_poolA), y_poolA)
+			dB_loss1 = 0.5 * mse_loss(tf.ones_like(y_realB), y_realB)
+			dB_loss2 = 0.5 * mse_loss(tf.zeros_like(y_poolB), y_poolB)
+			dA_loss = dA_loss1 + dA_loss2
+			dB_loss = dB_loss1 + dB_loss2
+			losses = [g_loss1, g_loss2, dA_loss, dB_loss]
+			if loss_scaling:
+				losses = [opt.get_scaled_loss(loss) for opt, loss in zip(optimizers, losses)]
+		# update each model with its own loss, the gradients of all replicas are summed so they are divided by the
+		# number of replicas to give the gradient of the mean over the global batch
+		for i, (opt, loss, model) in enumerate(zip(optimizers, losses, models)):
+			grads = tape.gradient(loss, model.weights)
+			if loss_scaling:
+				grads = opt.get_unscaled_gradients(grads)
+			if accumulators is None:
+				opt.apply_gradients(zip([grad / n_replicas for grad in grads], model.weights))
+			else:
+				# summed on this replica only, the update is made once every n_accum micro-batches
+				for accumulator, grad in zip(accumulators[i], grads):
+					accumulator.assign_add(grad)
+		del tape
+		return dA_loss1, dA_loss2, dB_loss1, dB_loss2, g_loss1, g_loss2, X_fakeA, X_fakeB
+	# update each model with the mean of its accumulated gradients and start accumulating again
+	def replica_apply():
+		for opt, model, accumulated in zip(optimizers, models, accumulators):
+			opt.apply_gradients(zip([accumulator / (n_replicas * n_accum) for accumulator in accumulated],
+				model.weights))
+			for accumulator in accumulated:
+				accumulator.assign(tf.zeros_like(accumulator))
+	# run the step on every replica, average the losses and collect the fakes of the global batch
+	@tf.function
+	def distributed_step(*batch):
+		results = strategy.run(replica_step, args=batch)
+		losses = [strategy.reduce(tf.distribute.ReduceOp.MEAN, loss, axis=None) for loss in results[:6]]
+		fakes = [strategy.gather(X, axis=0) for X in results[6:]]
+		return losses + fakes
+	# split each array of the global batch between the replicas
+	def shard(X):
+		n = len(X) // n_replicas
+		return strategy.experimental_distribute_values_from_function(
+			lambda ctx: X[ctx.replica_id_in_sync_group * n:(ctx.replica_id_in_sync_group + 1) * n])
+	def train_step(X_realA, X_realB, sourceA, historyA, sourceB, historyB):
+		sourceA, sourceB = asarray(sourceA, dtype='int32'), asarray(sourceB, dtype='int32')
+		return distributed_step(*[shard(X) for X in (X_realA, X_realB, sourceA, historyA, sourceB, historyB)])
+	# the update after n_accum micro-batches, nothing is left to do without accumulation
+	@tf.function
+	def apply_step():
+		strategy.run(replica_apply)
+	train_step.apply = (lambda: None) if accumulators is None else apply_step
+	train_step.n_accum = n_accum
+	# the optimizers with the variables they update, for checkpoints
+	train_step.optimizers = {
+		'fused_g_model_AtoB': (opt_AtoB, g_model_AtoB.weights),
+		'fused_g_model_BtoA': (opt_BtoA, g_model_BtoA.weights),
+		'fused_d_model_A': (opt_A, d_model_A.weights),
+		'fused_d_model_B': (opt_B, d_model_B.weights)}
+	return train_step
+
+'''
+The fused step trains on batches of any size. The instance normalization of the generators computes its statistics
+over each image on its own, so an image is normalized the same way whatever the size of its batch, and the pool gives
+every image of a batch the fake it would get if the images were passed through it one at a time, see ImagePool in
+data.py.
+
+With gradient accumulation, set by n_accum in the config, each update is made from n_accum micro-batches of n_batch
+images. The step is run on every micro-batch and only adds the gradients to accumulators on each replica, then
+train_step.apply() updates every model with their mean and clears them, which is the update of one batch of
+n_batch * n_accum images made in the memory of a micro-batch. The replicas only exchange gradients once per update. As
+the weights do not change between the micro-batches, and the pool sees the fakes of every micro-batch before the next
+one is selected, the result is that of one large batch up to rounding. An epoch is len(trainA) images, so it holds
+len(trainA) // (n_batch * n_accum) updates, the learning rate schedule, plots and checkpoints count in updates, and the
+batch sampler carries the left over images into the next epoch.
+'''
+
+'''
+Printing the losses of every one of the ~118,700 iterations forces every loss back to the host on every step, and it says
+nothing about where the time goes. The TrainingMetrics class below collects the losses of each step as they are
+returned, which are still tensors on the device with the fused training step, and only brings them back to the host as
+a single array once every interval steps, when the mean of each loss over the window is computed.
+
+The time spent in each phase of a step is measured with the phase() context manager and reported as the mean number of
+milliseconds per step over the window, together with the number of steps per second and the number of images per
+second, which is what compares runs with different batch sizes. Note that with the fused step
+the device work is only waited for when the fakes are pushed into the pool, so the time of the update shows up there.
+
+Every summary is printed and handed to a background thread that appends it to logs/metrics.csv and logs/metrics.jsonl
+and, optionally, writes it as TensorBoard scalars.
+'''
+
+# aggregates losses and phase timings over windows of steps and writes them in the background
+class TrainingMetrics:
+
+	def __init__(self, names, phases, directory='logs', interval=100, tensorboard=False, images_per_step=1):
+		self.names = list(names)
+		self.phases = list(phases)
+		self.directory = directory
+		self.interval = interval
+		self.tensorboard = tensorboard
+		self.images_per_step = images_per_step
+		self.losses = list()
+		self.timings = defaultdict(float)
+		self.start = time.time()
+		makedirs(directory, exist_ok=True)
+		self.queue = Queue()
+		self.thread = Thread(target=self._run, daemon=True)
+		self.thread.start()
+
+	# measure the time spent in a phase of the step
+	@contextmanager
+	def phase(self, name):
+		start = time.perf_counter()
+		yield
+		self.timings[name] += time.perf_counter() - start
+
+	# add the losses of a step, the summary of the window is written every interval steps
+	def record(self, step, losses):
+		self.losses.append(losses)
+		if step % self.interval == 0:
+			self.flush(step)
+
+	# summarize the current window
+	def flush(self, step):
+		if not self.losses:
+			return
+		n_steps = len(self.losses)
+		# the only point where the losses are brought back to the host
+		means = tf.reduce_mean(tf.convert_to_tensor(self.losses, dtype=tf.float32), axis=0).numpy()
+		elapsed = time.time() - self.start
+		summary = {'step': step, 'steps_per_sec': n_steps / elapsed, 'images_per_step': self.images_per_step,
+			'images_per_sec': n_steps * self.images_per_step / elapsed}
+		summary.update((name, float(value)) for name, value in zip(self.names, means))
+		summary.update(('%s_ms' % name, 1000.0 * self.timings[name] / n_steps) for name in self.phases)
+		print('>%d, %.2f steps/sec, %.1f images/sec, %s' % (step, summary['steps_per_sec'], summary['images_per_sec'],
+			' '.join('%s[%.3f]' % (name, summary[name]) for name in self.names)))
+		self.queue.put(summary)
+		self.losses, self.timings, self.start = list(), defaultdict(float), time.time()
+
+	# append each summary to the log files
+	def _run(self):
+		writer = None
+		while True:
+			summary = self.queue.get()
+			if summary is None:
+				break
+			try:
+				self._write(summary)
+				if self.tensorboard:
+					writer = writer or tf.summary.create_file_writer(self.directory)
+					with writer.as_default():
+						for name, value in summary.items():
+							if name != 'step':
+								tf.summary.scalar(name, value, step=summary['step'])
+					writer.flush()
+			except Exception as e:
+				# keep logging the other windows
+				print('>Failed to write metrics: %s' % e)
+
+	# append a summary to the csv and jsonl files
+	def _write(self, summary):
+		filename = join(self.directory, 'metrics.csv')
+		new_file = not exists(filename)
+		with open(filename, 'a', newline='') as f:
+			csv_writer = DictWriter(f, fieldnames=list(summary.keys()))
+			if new_file:
+				csv_writer.writeheader()
+			csv_writer.writerow(summary)
+		with open(join(self.directory, 'metrics.jsonl'), 'a') as f:
+			f.write(json.dumps(summary) + '\n')
+
+	# write the last window and stop the background thread
+	def close(self, step):
+		self.flush(step)
+		self.queue.put(None)
+		self.thread.join()
+
+'''
+Now we can define the training of each of the generator models.
+
+The train() function below takes all six models(two discriminator, two generator, and two composite models) as 
+arguments along with the dataset and trains the models.
+
+The schedule comes from the config, see config.py. By default the batch size is one image to match the description in
+the paper and the models are fit for 100 epochs. Larger batches, and gradient accumulation with the fused step, make
+fewer and larger updates per epoch. Give that the houses dataset has 1067 training images, one epoch is defined as
+1067 batches and the same number of training iterations. Images are generated using both generators each
+epoch and models are saved every five epochs or (1067*5)=5335 training iterations, and after the last one, together
+with a complete checkpoint. When an Evaluator from evaluation.py is given, the saved generators are also scored on the
+test images in its background process. The learning rate is set at the start of every epoch, constant by default or decaying linearly
+over the last decay_epochs epochs. The real images are random crops of load_size images, flipped and jittered as set
+in the config, drawn reproducibly when a seed is given. If checkpoint_dir already holds a checkpoint, training
+continues from the latest one unless resume is False. When started is given, the time of the first step since then is
+printed, which is how long a run takes to get going.
+
+The order of model updates is implemented to match the official Torch implementation. First, a batch of real images 
+from each domain is selected, then a batch of fake images for each domain is generated. The fake images are then used 
+to update each discriminator's fake image pool.
+
+Next, the Generator-A model(zebras to horses) is updated via the composite model, followed by the Discriminator-A model(horses).
+Then the Generator-B (houses to zebras) composite model and Discriminator-B(zebras) model are updated.
+
+Loss for each of the updated models is then recorded at the end of the training iteration. Importantly, only the 
+weighted average loss used to update each generator is reported.
+'''
+
+
+# train cyclegan models
+def train(d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB, c_model_BtoA, dataset, n_prefetch=2,
+		sampling='random', fused=False, strategy=None, config=None, checkpoint_dir='checkpoints', keep=3, resume=True,
+		log_dir='logs', log_interval=100, tensorboard=False, started=None, seed=None, evaluator=None):
+	# define properties of the training run
+	config = config or get_config()
+	n_epochs, n_batch, n_accum = config['n_epochs'], config['n_batch'], config['n_accum']
+	strategy = strategy or tf.distribute.get_strategy()
+	if n_batch % strategy.num_replicas_in_sync != 0:
+		raise ValueError('n_batch=%d is not a multiple of the %d replicas' % (n_batch, strategy.num_replicas_in_sync))
+	if n_accum > 1 and not fused:
+		raise ValueError('Gradient accumulation needs the fused training step')
+	# unpack dataset
+	trainA, trainB = dataset
+	if trainA.shape[1:3] != (config['load_size'], config['load_size']):
+		raise ValueError('The dataset holds %dx%d images, the config is for %dx%d images'
+			% (trainA.shape[1], trainA.shape[2], config['load_size'], config['load_size']))
+	# determine the output square shape of the discriminator
+	n_patch = patch_size(config['image_size'], config['d_layers'])
+	if tuple(d_model_A.output_shape[1:3]) != (n_patch, n_patch):
+		raise ValueError('The discriminator outputs %s patches, the config expects %dx%d'
+			% (d_model_A.output_shape[1:3], n_patch, n_patch))
+	# prepare image pool for fakes
+	poolA, poolB = ImagePool(config['pool_size']), ImagePool(config['pool_size'])
+	# calculate the number of updates per training epoch, each of n_accum batches
+	bat_per_epo = len(trainA) // (n_batch * n_accum)
+	if bat_per_epo == 0:
+		raise ValueError('An update of %d images is larger than the %d images of an epoch' % (n_batch * n_accum,
+			len(trainA)))
+	# calculate the number of training iterations
+	n_steps = bat_per_epo * n_epochs
+	# compile the fused training step
+	if fused:
+		train_step = define_train_step(g_model_AtoB, g_model_BtoA, d_model_A, d_model_B, config['lr'], strategy,
+			config['beta_1'], n_accum)
+		optimizers = train_step.optimizers
+	else:
+		optimizers = compiled_optimizers(d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB, c_model_BtoA)
+	# everything needed to resume training
+	models = {'g_model_AtoB': g_model_AtoB, 'g_model_BtoA': g_model_BtoA, 'd_model_A': d_model_A, 'd_model_B': d_model_B}
+	pools = {'poolA': poolA, 'poolB': poolB}
+	# continue from the latest checkpoint
+	first_step = 0
+	checkpoint = latest_checkpoint(checkpoint_dir) if resume else None
+	if checkpoint is not None:
+		first_step = restore_checkpoint(checkpoint, models, optimizers, pools, strategy)
+		print('>Resumed from %s at step %d' % (checkpoint, first_step))
+	# prepare augmented batches of real samples in the background, a resumed run continues with other draws
+	batches = BatchProvider(trainA, trainB, n_batch, n_patch, n_prefetch, sampling, config['image_size'],
+		config['flip'], config['jitter'], None if seed is None else (seed, first_step))
+	y_realA = y_realB = batches.y_real
+	y_fakeA = y_fakeB = batches.y_fake
+	# save checkpoints and plots in the background
+	writer = CheckpointWriter(checkpoint_dir, keep)
+	# aggregate losses and timings over windows of log_interval steps
+	metrics = TrainingMetrics(['dA_loss1', 'dA_loss2', 'dB_loss1', 'dB_loss2', 'g_loss1', 'g_loss2'],
+		['sampling', 'generate', 'pool', 'g_update', 'd_update', 'fused_update', 'checkpoint'],
+		log_dir, log_interval, tensorboard, n_batch * n_accum)
+	# manually enumerate epochs
+	for i in range(first_step, n_steps):
+		# set the learning rate of the epoch, also after resuming as it is not part of the optimizer state
+		if i == first_step or i % bat_per_epo == 0:
+			set_learning_rate(optimizers, learning_rate(i // bat_per_epo, config))
+		if fused:
+			# one batch, or the n_accum micro-batches of an update, each one passed through the pools before the next
+			losses = list()
+			for _ in range(n_accum):
+				# select a batch of real samples
+				with metrics.phase('sampling'):
+					X_realA, X_realB = batches.next()
+				# choose the pooled fakes, then update all models in one step
+				with metrics.phase('pool'):
+					sourceA, historyA = poolA.select(n_batch, X_realA.shape[1:])
+					sourceB, historyB = poolB.select(n_batch, X_realB.shape[1:])
+				with metrics.phase('fused_update'):
+					results = train_step(X_realA, X_realB, sourceA, historyA, sourceB, historyB)
+				losses.append(results[:6])
+				# store the new fakes in the pool
+				with metrics.phase('pool'):
+					poolA.push(results[6].numpy())
+					poolB.push(results[7].numpy())
+			# update with the accumulated gradients
+			with metrics.phase('fused_update'):
+				train_step.apply()
+			# the mean losses of the micro-batches
+			dA_loss1, dA_loss2, dB_loss1, dB_loss2, g_loss1, g_loss2 = [tf.add_n(list(loss)) / n_accum
+				for loss in zip(*losses)]
+		else:
+			# select a batch of real samples
+			with metrics.phase('sampling'):
+				X_realA, X_realB = batches.next()
+			# generate a batch of fake samples
+			with metrics.phase('generate'):
+				X_fakeA = g_model_BtoA.predict(X_realB)
+				X_fakeB = g_model_AtoB.predict(X_realA)
+			# update fakes from pool
+			with metrics.phase('pool'):
+				X_fakeA = update_image_pool(poolA, X_fakeA)
+				X_fakeB = update_image_pool(poolB, X_fakeB)
+			# update generator B->A via adversarial and cycle loss
+			with metrics.phase('g_update'):
+				g_loss2, _, _, _, _  = c_model_BtoA.train_on_batch([X_realB, X_realA], [y_realA, X_realA, X_realB, X_realA])
+			# update discriminator for A -> [real/fake]
+			with metrics.phase('d_update'):
+				dA_loss1 = d_model_A.train_on_batch(X_realA, y_realA)
+				dA_loss2 = d_model_A.train_on_batch(X_fakeA, y_fakeA)
+			# update generator A->B via adversarial and cycle loss
+			with metrics.phase('g_update'):
+				g_loss1, _, _, _, _ = c_model_AtoB.train_on_batch([X_realA, X_realB], [y_realB, X_realB, X_realA, X_realB])
+			# update discriminator for B -> [real/fake]
+			with metrics.phase('d_update'):
+				dB_loss1 = d_model_B.train_on_batch(X_realB, y_realB)
+				dB_loss2 = d_model_B.train_on_batch(X_fakeB, y_fakeB)
+		# summarize performance every log_interval steps
+		metrics.record(i+1, (dA_loss1, dA_loss2, dB_loss1, dB_loss2, g_loss1, g_loss2))
+		# the time from the start of the run to the first finished step, including imports, model building and tracing
+		if i == first_step and started is not None:
+			print('>First step done %.1fs after start' % (time.time() - started))
+		with metrics.phase('checkpoint'):
+			# evaluate the model performance every so often
+			if (i+1) % (bat_per_epo * config['plot_every']) == 0:
+				# plot A->B translation
+				summarize_performance(i, g_model_AtoB, trainA, 'AtoB', writer=writer)
+				# plot B->A translation
+				summarize_performance(i, g_model_BtoA, trainB, 'BtoA', writer=writer)
+			if (i+1) % (bat_per_epo * config['save_every']) == 0 or i+1 == n_steps:
+				# save the models
+				filename1, filename2 = save_models(i, g_model_AtoB, g_model_BtoA, writer)
+				# score them on the test images in the background, once the writer has written them
+				if evaluator is not None:
+					writer.submit(evaluator.submit, i+1, {'AtoB': filename1, 'BtoA': filename2})
+				# save everything needed to resume after this step
+				writer.save_checkpoint(i+1, snapshot_checkpoint(i+1, models, optimizers, pools))
+	batches.close()
+	# wait for the last files to be written
+	writer.close()
+	metrics.close(n_steps)
+
+'''
+The loss is reported every log_interval training iterations as the mean over those iterations, including the
+Discriminator-A loss on real and fake examples(dA), Discriminator-B loss on real and fake examples(dB), and
+Generaotr-AtoB and Generator-BtoA loss, each of which is a weighted average of adversarial, identity, forward, and
+backward cycle loss(g). The time per step of each phase is written to the log files in log_dir.
+'''
@@ -0,0 +1,33 @@
+# Scoring trained generators on the held out test images
+'''
+This script computes the FID and KID of generators saved by save_models() in cyclegan/training.py on the test images
+that prepare.py keeps apart from the training images, see cyclegan/evaluation.py.
+
+	python evaluate.py --AtoB g_model_AtoB_005335.h5 --BtoA g_model_BtoA_005335.h5 --dataset horse2zebra_256
+
+The features come from the network in --features, a Keras model saved to a local file. train.py runs the same
+evaluation in a background process every time it saves the generators when it is given --features.
+'''
+import argparse
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Compute the FID and KID of CycleGAN generators on the test images')
+	parser.add_argument('--AtoB', default=None, help='generator from domain A to domain B')
+	parser.add_argument('--BtoA', default=None, help='generator from domain B to domain A')
+	parser.add_argument('--dataset', default='horse2zebra_256', help='dataset written by prepare.py')
+	parser.add_argument('--features', default='inception_v3.h5', help='feature network saved as a Keras model')
+	parser.add_argument('--batch-size', type=int, default=25, help='images per generator and feature network call')
+	args = parser.parse_args()
+	filenames = dict((direction, filename) for direction, filename in (('AtoB', args.AtoB), ('BtoA', args.BtoA))
+		if filename is not None)
+	if not filenames:
+		parser.error('give at least one of --AtoB and --BtoA')
+	from cyclegan.data import load_test_samples
+	from cyclegan.evaluation import load_feature_model
+	from cyclegan.evaluation import evaluate_generators
+	test_dataset = load_test_samples(args.dataset)
+	print('Loaded', test_dataset[0].shape, test_dataset[1].shape)
+	results = evaluate_generators(filenames, test_dataset, load_feature_model(args.features), args.batch_size)
+	for direction in sorted(results):
+		print('%s: FID %.2f, KID %.4f +- %.4f' % (direction, results[direction]['fid'], results[direction]['kid'],
+			results[direction]['kid_std']))
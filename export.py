@@ -0,0 +1,91 @@
+# Exporting a trained generator for serving
+'''
+This script turns a generator saved by save_models() in cyclegan/training.py into the inference artifacts of
+cyclegan/export.py, a frozen and optimized SavedModel and a TFLite model, optionally quantized, that infer.py serves in
+place of the .h5 file:
+
+	python export.py g_model_AtoB_005335.h5 --output exported/
+	python export.py g_model_AtoB_005335.h5 --output exported/ --formats tflite --quantize int8 --dataset horse2zebra_256
+	python infer.py exported/g_model_AtoB_005335_int8.tflite --input ../input/horses/ --output zebras/
+
+Every artifact is loaded back as infer.py loads it and checked against the .h5 model on the same images, the test
+images of --dataset when it is given and random images otherwise. The time to load it, the time per image and the
+largest and mean absolute difference are printed below the load time and time per image of the .h5 model, and the exit
+status is 1 when a mean difference is above the tolerance of its format. The test images also calibrate the int8
+quantization, which needs --dataset.
+'''
+import sys
+import time
+import argparse
+from os.path import basename
+from os.path import join
+from os.path import splitext
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Export a CycleGAN generator as a SavedModel and a TFLite model')
+	parser.add_argument('model', help='generator saved by save_models(), e.g. g_model_AtoB_005335.h5')
+	parser.add_argument('--output', default='exported', help='directory for the artifacts')
+	parser.add_argument('--formats', nargs='+', default=['saved_model', 'tflite'], choices=['saved_model', 'tflite'])
+	parser.add_argument('--quantize', default='none', choices=['none', 'float16', 'dynamic', 'int8'],
+		help='post-training quantization of the TFLite model')
+	parser.add_argument('--size', type=int, default=None,
+		help='image size of the TFLite model, by default the trained one')
+	parser.add_argument('--dataset', default=None, help='dataset written by prepare.py, for its test images')
+	parser.add_argument('--parity-images', type=int, default=8, help='images to compare the artifacts on')
+	parser.add_argument('--seed', type=int, default=1)
+	args = parser.parse_args()
+	if args.quantize == 'int8' and args.dataset is None:
+		parser.error('--quantize int8 calibrates on the test images of --dataset')
+	from numpy.random import default_rng
+	from cyclegan.data import center_crop
+	from cyclegan.data import scale_images
+	from cyclegan.data import load_test_samples
+	from cyclegan.export import TOLERANCES
+	from cyclegan.export import export_saved_model
+	from cyclegan.export import export_tflite
+	from cyclegan.export import check_parity
+	from cyclegan.export import time_translation
+	from cyclegan.serving import load_generator
+	from cyclegan.serving import load_saved_model
+	from cyclegan.serving import load_tflite
+	from cyclegan.serving import resize_model
+	start = time.perf_counter()
+	model, reference = load_generator(args.model)
+	h5_load_time = time.perf_counter() - start
+	image_shape = tuple(model.input_shape[1:])
+	if args.size is not None:
+		# the TFLite model and the parity check are for images of another size
+		image_shape = (args.size, args.size, image_shape[-1])
+		_, reference = load_generator(args.model, tile=args.size)
+	# images in [-1,1] for the int8 calibration and the parity check
+	if args.dataset is not None:
+		test = load_test_samples(args.dataset)[0]
+		X = scale_images(center_crop(test, image_shape[0]))
+	else:
+		X = default_rng(args.seed).uniform(-1, 1, (args.parity_images,) + image_shape).astype('float32')
+	name = splitext(basename(args.model))[0]
+	artifacts = list()
+	if 'saved_model' in args.formats:
+		directory = join(args.output, name)
+		export_saved_model(model, directory)
+		artifacts.append(('saved_model', directory, load_saved_model))
+	if 'tflite' in args.formats:
+		suffix = '' if args.quantize == 'none' else '_' + args.quantize
+		filename = join(args.output, name + suffix + '.tflite')
+		export_tflite(resize_model(model, image_shape), filename, args.quantize, image_shape, X)
+		artifacts.append((args.quantize, filename, load_tflite))
+	# load every artifact back and compare it with the .h5 model
+	failed = False
+	X = X[:args.parity_images]
+	print('%-36s %8s %10s %10s %10s' % ('artifact', 'load s', 'ms/image', 'max diff', 'mean diff'))
+	print('%-36s %8.2f %10.1f %10s %10s' % (basename(args.model), h5_load_time, time_translation(reference, X), '-', '-'))
+	for kind, path, loader in artifacts:
+		start = time.perf_counter()
+		_, translate = loader(path)
+		load_time = time.perf_counter() - start
+		parity = check_parity(reference, translate, X)
+		passed = parity['mean_diff'] <= TOLERANCES[kind]
+		failed = failed or not passed
+		print('%-36s %8.2f %10.1f %10.5f %10.5f%s' % (basename(path), load_time, time_translation(translate, X),
+			parity['max_diff'], parity['mean_diff'], '' if passed else '  MISMATCH'))
+	sys.exit(1 if failed else 0)
@@ -0,0 +1,64 @@
+# Translating images with a trained generator
+'''
+This script loads a generator saved by save_models() in cyclegan/training.py, e.g. g_model_AtoB_005335.h5, or exported
+from one by export.py, a SavedModel directory or a .tflite file, once and streams images through it. The images are
+read from a directory, or from a list of filenames on stdin when the input is '-', and the translated images are
+written to the output directory as PNG files with the same base name.
+
+	python infer.py g_model_AtoB_005335.h5 --input ../input/horses/ --output zebras/
+	python infer.py exported/g_model_AtoB_005335.tflite --input ../input/horses/ --output zebras/
+
+An exported generator starts faster, it is loaded as a plain graph rather than rebuilt by Keras, and a TFLite one does
+not import TensorFlow at all when the LiteRT interpreter is installed, see cyclegan/serving.py.
+
+The work is split into three stages that overlap:
+	decode     a pool of worker processes loads and resizes the images
+	translate  the main thread collects decoded images into batches and runs the generator on each batch
+	write      a pool of threads scales the translated images back to [0,255] and saves them
+
+A batch is run as soon as it holds --batch-size images or the oldest image in it has waited --max-latency
+milliseconds, so a slow trickle of images is not held back waiting for a full batch. The number of images being decoded
+or waiting for the generator is bounded, so memory does not grow with the size of the input.
+
+With --tile the images are not resized. Each one is translated at its full resolution as overlapping square tiles, see
+translate_tiled() in cyclegan/inference.py.
+
+When the run is finished, the latency of each image from being read to being written is reported as percentiles,
+together with the throughput in images/sec.
+'''
+import time
+import argparse
+from multiprocessing import Pool
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Translate images with a trained CycleGAN generator')
+	parser.add_argument('model', help='generator saved by save_models() or exported by export.py')
+	parser.add_argument('--input', default='-', help="directory of images, or '-' to read filenames from stdin")
+	parser.add_argument('--output', required=True, help='directory for the translated images')
+	parser.add_argument('--batch-size', type=int, default=8, help='largest number of images per generator call')
+	parser.add_argument('--max-latency', type=float, default=50, help='longest wait in ms for a batch to fill')
+	parser.add_argument('--workers', type=int, default=None, help='number of decode processes')
+	parser.add_argument('--precision', default='float32', choices=['float32', 'float16', 'bfloat16'],
+		help='precision of an .h5 generator')
+	parser.add_argument('--tile', type=int, default=None, help='translate at full resolution as tiles of this size')
+	parser.add_argument('--overlap', type=int, default=32, help='overlap in pixels between neighbouring tiles')
+	args = parser.parse_args()
+	# the generator downsamples twice, so a tile has to be a multiple of 4
+	if args.tile is not None and (args.tile % 4 != 0 or not 0 <= args.overlap < args.tile):
+		parser.error('--tile must be a multiple of 4 and larger than --overlap')
+	# start the decode processes before TensorFlow is imported and starts its own threads
+	with Pool(args.workers) as pool:
+		from cyclegan.serving import load_translator
+		from cyclegan.inference import list_inputs
+		from cyclegan.inference import translate_images
+		from cyclegan.inference import report
+		# load the generator once
+		try:
+			image_shape, translate = load_translator(args.model, args.precision, args.tile)
+		except ValueError as e:
+			parser.error(str(e))
+		size = tuple(image_shape[:2])
+		start = time.time()
+		latencies = translate_images(translate, list_inputs(args.input), args.output, pool, size, args.batch_size,
+			args.max_latency / 1000.0, tile=args.tile, overlap=args.overlap)
+		report(latencies, time.time() - start)
@@ -0,0 +1,41 @@
+# Preparing the horses and zebra dataset
+'''
+This script decodes the trainA/testA (horses) and trainB/testB (zebras) folders into the arrays read by train.py, the
+test images kept apart for evaluate.py.
+
+	python prepare.py --input ../input/cyclegan/horse2zebra/horse2zebra/ --output horse2zebra_256
+	python prepare.py --input ../input/cyclegan/horse2zebra/horse2zebra/ --preset fast
+	python prepare.py --input ../input/cyclegan/horse2zebra/horse2zebra/ --preset paper
+
+The images are prepared at the load size of the preset, 286x286 for 'paper' which trains on random 256x256 crops.
+
+The output is a directory of memory-mappable uint8 A.npy and B.npy files, or a compressed file when it ends in .npz.
+Running it again only decodes the images added or changed since, which are appended to the arrays, and nothing at all
+when the output is up to date with the images. Exact and near-duplicate images are dropped, the manifest of the output
+lists them with the image each one duplicates, see build_dataset() in cyclegan/data.py. Neither this script nor the
+decode workers import TensorFlow.
+'''
+import argparse
+from cyclegan.config import PRESETS
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Build the CycleGAN training arrays from folders of images')
+	parser.add_argument('--input', default='../input/cyclegan/horse2zebra/horse2zebra/',
+		help='directory holding the trainA, testA, trainB and testB folders')
+	parser.add_argument('--output', default=None,
+		help='directory of .npy files, or a .npz file, horse2zebra_<size> by default')
+	parser.add_argument('--preset', default='default', choices=sorted(PRESETS), help='preset of train.py to prepare for')
+	parser.add_argument('--size', type=int, default=None,
+		help='height and width of the images, by default the load size of the preset')
+	parser.add_argument('--workers', type=int, default=None, help='number of decode processes')
+	parser.add_argument('--force', action='store_true', help='decode every image again')
+	parser.add_argument('--max-distance', type=int, default=None,
+		help='bits of the difference hashes in which near duplicates differ at most, -1 keeps them')
+	args = parser.parse_args()
+	from cyclegan.config import get_config
+	from cyclegan.data import build_dataset
+	from cyclegan.data import NEAR_DUPLICATE_BITS
+	size = args.size or get_config(args.preset)['load_size']
+	output = args.output or 'horse2zebra_%d' % size
+	max_distance = NEAR_DUPLICATE_BITS if args.max_distance is None else args.max_distance
+	build_dataset(args.input.rstrip('/') + '/', output, (size, size), args.workers, args.force, max_distance)
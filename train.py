@@ -0,0 +1,114 @@
+# Training a CycleGAN on the horse2zebra dataset
+'''
+This script trains the two generators and two discriminators on the arrays written by prepare.py.
+
+	python train.py --dataset horse2zebra_256 --fused
+	python train.py --preset fast --images ../input/cyclegan/horse2zebra/horse2zebra/
+	python train.py --dataset horse2zebra_256 --fused --batch 4 --accumulate 4
+
+The sizes of the models and the schedule come from a preset of cyclegan/config.py, 'default' unless --preset is given,
+and the options below replace single settings of it. The dataset has to hold images of the load size of the preset,
+which are randomly cropped to its image size, by default it is horse2zebra_<load size>. With --seed the batches, crops
+and flips are the same on every run.
+
+With --accumulate the fused step makes each update from several batches, an update of --batch times --accumulate images
+that only needs the memory of one batch. The metrics report the throughput in images per second, to compare batch
+sizes.
+
+With --features, the generators are scored on the test images every time they are saved, by a background process
+that writes the FID and KID of each saved step to <log dir>/evaluation.jsonl, see cyclegan/evaluation.py.
+
+With --images the dataset is prepared first, which only takes the time to hash the images when it is up to date.
+TensorFlow is imported after the arguments are parsed, so --help and argument errors come back at once. How long a
+run takes to get going is printed once the first training step is done, counted from the start of the script:
+
+	time python train.py --help
+	python train.py --dataset horse2zebra_256 | grep 'First step'
+'''
+import time
+# taken first, so that the time to the first step includes every import
+started = time.time()
+import argparse
+from cyclegan.config import PRESETS
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Train a CycleGAN on a prepared dataset')
+	parser.add_argument('--preset', default='default', choices=sorted(PRESETS))
+	parser.add_argument('--dataset', default=None,
+		help='dataset written by prepare.py, horse2zebra_<load size> by default')
+	parser.add_argument('--images', default=None, help='prepare the dataset from this directory of images first')
+	parser.add_argument('--strategy', default='auto', choices=['auto', 'default', 'mirrored', 'multi_worker', 'tpu'])
+	parser.add_argument('--cpu-devices', type=int, default=1, help='split the CPU into this many devices')
+	parser.add_argument('--precision', default='float32', choices=['float32', 'mixed_bfloat16', 'mixed_float16'])
+	parser.add_argument('--batch', type=int, default=None, help='images per step, one per replica by default')
+	parser.add_argument('--accumulate', type=int, default=None,
+		help='micro-batches of --batch images whose gradients make one update, needs --fused')
+	parser.add_argument('--epochs', type=int, default=None, help='number of epochs')
+	parser.add_argument('--decay-epochs', type=int, default=None, help='final epochs of linear learning rate decay')
+	parser.add_argument('--lr', type=float, default=None, help='initial learning rate')
+	parser.add_argument('--n-resnet', type=int, default=None, help='resnet blocks of the generators')
+	parser.add_argument('--g-filters', type=int, default=None, help='filters of the first generator layer')
+	parser.add_argument('--load-size', type=int, default=None, help='size of the prepared images that are cropped')
+	parser.add_argument('--flip', action='store_true', default=None, help='mirror half of the images')
+	parser.add_argument('--jitter', type=float, default=None, help='strength of the random color changes')
+	parser.add_argument('--seed', type=int, default=None, help='seed of the batches and their augmentation')
+	parser.add_argument('--fused', action='store_true', help='update all models in a single compiled step')
+	parser.add_argument('--sampling', default='random', choices=['random', 'epoch'])
+	parser.add_argument('--prefetch', type=int, default=2, help='batches prepared ahead, 0 to prepare in the foreground')
+	parser.add_argument('--checkpoint-dir', default='checkpoints')
+	parser.add_argument('--keep', type=int, default=3, help='number of checkpoints to keep')
+	parser.add_argument('--no-resume', action='store_true', help='start over even when there is a checkpoint')
+	parser.add_argument('--log-dir', default='logs')
+	parser.add_argument('--log-interval', type=int, default=100, help='steps per logged window')
+	parser.add_argument('--tensorboard', action='store_true', help='also write the metrics as TensorBoard scalars')
+	parser.add_argument('--features', default=None, help='feature network to score the saved generators with')
+	args = parser.parse_args()
+	from cyclegan.config import get_config
+	from cyclegan.data import build_dataset
+	from cyclegan.data import load_real_samples
+	# the settings of the preset with the ones given replaced
+	try:
+		config = get_config(args.preset, n_batch=args.batch, n_accum=args.accumulate, n_epochs=args.epochs,
+			decay_epochs=args.decay_epochs, lr=args.lr, n_resnet=args.n_resnet, g_filters=args.g_filters,
+			load_size=args.load_size, flip=args.flip, jitter=args.jitter)
+	except ValueError as e:
+		parser.error(str(e))
+	if config['n_accum'] > 1 and not args.fused:
+		parser.error('--accumulate needs --fused')
+	size = config['load_size']
+	dataset_name = args.dataset or 'horse2zebra_%d' % size
+	if args.images is not None:
+		build_dataset(args.images.rstrip('/') + '/', dataset_name, (size, size))
+	# load image data, before TensorFlow is imported
+	dataset = load_real_samples(dataset_name)
+	print('Loaded', dataset[0].shape, dataset[1].shape)
+	from cyclegan.models import get_strategy
+	from cyclegan.models import set_precision
+	from cyclegan.models import define_models
+	from cyclegan.training import train
+	# choose how the models are distributed, before TensorFlow initializes its devices
+	strategy = get_strategy(args.strategy, args.cpu_devices)
+	# compute in float32, or in mixed precision, see set_precision()
+	set_precision(args.precision)
+	# one image per replica unless the batch size is given
+	if args.batch is None:
+		config['n_batch'] = strategy.num_replicas_in_sync
+	# define input shape based on the crops of the loaded dataset
+	image_shape = (config['image_size'], config['image_size'], dataset[0].shape[3])
+	# define all models under the strategy
+	d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB, c_model_BtoA = define_models(image_shape, strategy,
+		config)
+	# score the saved generators in the background
+	evaluator = None
+	if args.features is not None:
+		from cyclegan.evaluation import Evaluator
+		evaluator = Evaluator(dataset_name, args.features, args.log_dir)
+	# train models
+	train(d_model_A, d_model_B, g_model_AtoB, g_model_BtoA, c_model_AtoB, c_model_BtoA, dataset,
+		n_prefetch=args.prefetch, sampling=args.sampling, fused=args.fused, strategy=strategy, config=config,
+		checkpoint_dir=args.checkpoint_dir, keep=args.keep, resume=not args.no_resume, log_dir=args.log_dir,
+		log_interval=args.log_interval, tensorboard=args.tensorboard, started=started, seed=args.seed,
+		evaluator=evaluator)
+	if evaluator is not None:
+		# wait for the scores of the last generators
+		evaluator.close()